@@ -0,0 +1,45 @@
+"""
+Measure iceplotlib import times in fresh interpreters.
+
+Only the standard library is used here, so that the lazy import checks can
+run without loading any of the packages they look for.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+# repository root directory
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that should not be loaded by importing each iceplotlib module
+LAZY_IMPORTS = [
+    ('iceplotlib.plot', ['matplotlib.pyplot', 'netCDF4', 'scipy', 'cartopy']),
+    ('iceplotlib.cm', ['matplotlib', 'netCDF4', 'scipy', 'cartopy']),
+    ('iceplotlib.colors', ['matplotlib', 'netCDF4', 'scipy', 'cartopy']),
+    ('iceplotlib.flowlines', ['matplotlib', 'netCDF4', 'scipy', 'cartopy']),
+    ('iceplotlib.animation', ['matplotlib.pyplot', 'scipy', 'cartopy']),
+]
+
+
+def measure_import(module, repeat=3):
+    """Time importing a module in fresh interpreters, list loaded modules."""
+    code = ('import sys, time; t = time.perf_counter(); import %s; '
+            'print(time.perf_counter()-t); print(" ".join(sys.modules))'
+            % module)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [_root] + os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    times = []
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        elapsed, modules = out.decode().splitlines()
+        times.append(float(elapsed))
+    return dict(min=min(times), median=statistics.median(times),
+                mean=statistics.mean(times), repeat=repeat,
+                modules=sorted(modules.split()))
+
+
+def lazy_failures(module, lazy, modules):
+    """List messages for lazily imported modules found in a module list."""
+    return ['%s imports %s' % (module, m) for m in lazy if m in modules]
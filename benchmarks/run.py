@@ -0,0 +1,286 @@
+"""
+Run the iceplotlib benchmark suite on synthetic data.
+
+Usage::
+
+    python benchmarks/run.py --sizes 101x101 301x301 --frames 11 --files 1 4
+
+Import times of iceplotlib modules are measured in fresh interpreters. With
+``--check-imports`` only these are measured, and the script fails if any
+module meant to be imported lazily was loaded at import time.
+
+Each run is appended to a JSON history file (``benchmarks/history.json`` by
+default) together with the parameters and library versions used, so that
+timings can be compared across commits. Everything runs offline.
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import iceplotlib.plot as iplt
+import iceplotlib.animation as iani
+from iceplotlib.flowlines import pathline, streamline
+from importtime import LAZY_IMPORTS, lazy_failures, measure_import
+from synthetic import make_dataset, yr2s
+
+
+# Benchmark cases
+# ---------------
+
+def _case_method(name, *args, **kwargs):
+    """Return a case drawing one IceDataset method on a fresh axes."""
+    def case(nc, t):
+        fig = iplt.figure()
+        ax = fig.add_subplot(111)
+        getattr(nc, name)(*args, ax=ax, t=t, **kwargs)
+        fig.canvas.draw()
+        iplt.close(fig)
+    return case
+
+
+def _case_cold(case):
+    """Return a case clearing cached streamline layouts before each run."""
+    def cold(nc, t):
+        nc.__dict__.pop('_streamlines', None)
+        case(nc, t)
+    return cold
+
+
+def _case_iceanim(nc, t):
+    """Render all frames of an ice map animation."""
+    fig = iplt.figure()
+    fig.add_subplot(111)
+    ani = iani.iceanim(nc)
+    for frame in nc.variables['time'][:]/yr2s:
+        ani._draw_frame(frame)
+        fig.canvas.draw()
+    iplt.close(fig)
+
+
+def _case_iceanim_rgba(nc, t):
+    """Render all frames of an ice map animation composited in NumPy."""
+    fig = iplt.figure()
+    fig.add_subplot(111)
+    ani = iani.iceanim_rgba(nc)
+    for frame in nc.variables['time'][:]/yr2s:
+        ani._draw_frame(frame)
+        fig.canvas.draw()
+    iplt.close(fig)
+
+
+def _case_streamline(nc, t):
+    x = nc.variables['x'][:]
+    y = nc.variables['y'][:]
+    streamline(nc, 'velsurf', (x.mean()/2, y.mean()/2), t=t, n=101)
+
+
+def _case_pathline(nc, t):
+    x = nc.variables['x'][:]
+    y = nc.variables['y'][:]
+    pathline(nc, 'velsurf', (x.mean()/2, y.mean()/2), t=t, n=101)
+
+
+CASES = [
+    ('contour', _case_method('contour', 'usurf')),
+    ('contourf', _case_method('contourf', 'thk')),
+    ('imshow', _case_method('imshow', 'topg')),
+    ('quiver', _case_method('quiver', 'velsurf')),
+    ('streamplot', _case_cold(_case_method('streamplot', 'velsurf'))),
+    ('streamplot_cached', _case_method('streamplot', 'velsurf')),
+    ('icemargin', _case_method('icemargin')),
+    ('icemarginf', _case_method('icemarginf')),
+    ('shading', _case_method('shading', 'topg')),
+    ('icemap', _case_method('icemap')),
+    ('iceanim', _case_iceanim),
+    ('iceanim_rgba', _case_iceanim_rgba),
+    ('streamline', _case_streamline),
+    ('pathline', _case_pathline),
+]
+
+
+# Timing helpers
+# --------------
+
+def measure(func, repeat=3):
+    """Time a callable and record its peak traced memory in KiB."""
+    times = []
+    peak = 0
+    for i in range(repeat):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter()-start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return dict(min=min(times), median=float(np.median(times)),
+                mean=float(np.mean(times)), repeat=repeat,
+                peak_kib=peak/1024.0)
+
+
+def run_imports(repeat=3):
+    """Measure import times and return results and lazy import failures."""
+    results = {}
+    failures = []
+    for module, lazy in LAZY_IMPORTS:
+        res = measure_import(module, repeat)
+        modules = res.pop('modules')
+        results[module] = res
+        failures += lazy_failures(module, lazy, modules)
+        sys.stderr.write('%-20s %-17s %8.4f s\n' % (
+            'import', module.split('.')[-1], res['min']))
+    return results, failures
+
+
+def _git_revision():
+    """Return the current git commit hash if available."""
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      stderr=subprocess.DEVNULL,
+                                      cwd=os.path.dirname(__file__))
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, frames, files, repeat=3, cases=None, zlib=False, order='xy'):
+    """Run selected benchmark cases and return a results dictionary."""
+    results = {}
+    tmpdir = tempfile.mkdtemp(prefix='iceplotlib-bench-')
+    try:
+        for nx, ny in sizes:
+            for nfiles in files:
+
+                # generate synthetic data
+                key = '%dx%dx%d/%dfiles' % (nx, ny, frames, nfiles)
+                filename = os.path.join(tmpdir, '%dx%d.nc' % (nx, ny))
+                filenames = make_dataset(filename, nx=nx, ny=ny, nt=frames,
+                                         nfiles=nfiles, order=order,
+                                         zlib=zlib)
+                pattern = (filenames[0] if nfiles == 1 else
+                           filename.replace('.nc', '-*.nc'))
+                results[key] = res = {}
+
+                # time opening the dataset
+                def load():
+                    iplt.load(pattern).close()
+                res['load'] = measure(load, repeat)
+
+                # time plotting and flowline cases
+                nc = iplt.load(pattern)
+                t = float(nc.variables['time'][frames//2])/yr2s
+                for name, case in CASES:
+                    if cases and name not in cases:
+                        continue
+                    res[name] = measure(lambda: case(nc, t), repeat)
+                    sys.stderr.write('%-20s %-17s %8.4f s %10.1f KiB\n' % (
+                        key, name, res[name]['min'], res[name]['peak_kib']))
+                nc.close()
+
+                # remove files
+                for fname in filenames:
+                    os.remove(fname)
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+# History handling
+# ----------------
+
+def load_history(filename):
+    """Load benchmark history from a JSON file."""
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(previous, current):
+    """Print minimum time ratios of current results to a previous run."""
+    for key in sorted(current):
+        for name, res in sorted(current[key].items()):
+            old = previous.get(key, {}).get(name)
+            if old is None:
+                continue
+            print('%-20s %-17s %8.4f s -> %8.4f s (x%.2f)' % (
+                key, name, old['min'], res['min'], res['min']/old['min']))
+
+
+def main(argv=None):
+    """Parse command-line arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['101x101'],
+                        help='grid sizes as NXxNY (default: 101x101)')
+    parser.add_argument('--frames', type=int, default=11,
+                        help='number of time records (default: 11)')
+    parser.add_argument('--files', type=int, nargs='+', default=[1],
+                        help='number of files to split records over')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of repetitions per case (default: 3)')
+    parser.add_argument('--cases', nargs='+', choices=[c[0] for c in CASES],
+                        help='run only these cases (load always runs)')
+    parser.add_argument('--order', choices=['xy', 'yx'], default='xy',
+                        help='dimension order of 2D fields (default: xy)')
+    parser.add_argument('--zlib', action='store_true',
+                        help='write compressed variables')
+    parser.add_argument('--check-imports', action='store_true',
+                        help='only check import times and lazy imports')
+    parser.add_argument('--label', help='label stored with the results')
+    parser.add_argument('--history', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'history.json'),
+                        help='JSON history file to append results to')
+    args = parser.parse_args(argv)
+
+    # run benchmarks
+    sizes = [tuple(int(n) for n in s.split('x')) for s in args.sizes]
+    params = dict(sizes=args.sizes, frames=args.frames, files=args.files,
+                  repeat=args.repeat, order=args.order, zlib=args.zlib)
+    results = {}
+    results['import'], failures = run_imports(repeat=args.repeat)
+    for failure in failures:
+        sys.stderr.write('lazy import failure: %s\n' % failure)
+    if args.check_imports:
+        sys.exit(len(failures) > 0)
+    results.update(run(sizes, args.frames, args.files, repeat=args.repeat,
+                       cases=args.cases, zlib=args.zlib, order=args.order))
+
+    # compare to last run with the same parameters
+    history = load_history(args.history)
+    for entry in reversed(history):
+        if entry['params'] == params:
+            compare(entry['results'], results)
+            break
+
+    # append to history
+    history.append(dict(
+        date=datetime.datetime.now().isoformat(),
+        label=args.label, commit=_git_revision(), params=params,
+        versions=dict(python=platform.python_version(),
+                      numpy=np.__version__,
+                      matplotlib=matplotlib.__version__),
+        platform=platform.platform(), results=results))
+    with open(args.history, 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Generate synthetic PISM-like NetCDF files for benchmarking.
+
+The fields mimic an ice dome growing and decaying over a sinusoidal bed so
+that all masking, shading and flowline code paths see realistic data. No
+network access is needed.
+"""
+
+import numpy as np
+from netCDF4 import Dataset
+
+# convert seconds to year
+yr2s = 365.0 * 24 * 60 * 60
+
+
+def _fields(x, y, t, order):
+    """Compute synthetic fields for one time slice."""
+
+    # bed topography is a tilted sinusoidal landscape
+    xx, yy = np.meshgrid(x, y, indexing='ij')
+    lx = x[-1] - x[0]
+    ly = y[-1] - y[0]
+    topg = (1500.0*np.sin(4*np.pi*xx/lx)*np.cos(3*np.pi*yy/ly)
+            + 2000.0*xx/lx)
+
+    # ice thickness is a parabolic dome with a time-varying radius
+    radius = 0.5*min(lx, ly)*(0.6+0.4*np.sin(2*np.pi*t/(t.max() or 1.0)))
+    dist = ((xx-x.mean())**2 + (yy-y.mean())**2)**0.5
+    thk = np.zeros((len(t),)+xx.shape)
+    for i, r in enumerate(radius):
+        thk[i] = 3000.0*np.clip(1-(dist/r)**2, 0, None)**0.5
+    usurf = np.maximum(topg, 0) + thk
+
+    # surface velocity goes downslope and scales with thickness
+    dx = x[1] - x[0]
+    dy = y[1] - y[0]
+    u = np.zeros_like(thk)
+    v = np.zeros_like(thk)
+    for i in range(len(t)):
+        gx, gy = np.gradient(usurf[i], dx, dy)
+        u[i] = -1e5*gx*thk[i]/3000.0
+        v[i] = -1e5*gy*thk[i]/3000.0
+    c = (u**2 + v**2)**0.5
+
+    # mask follows PISM conventions (0 ice-free, 2 grounded, 4 ocean)
+    mask = np.where(thk > 0, 2, np.where(topg < 0, 4, 0))
+
+    # PISM writes either (time, x, y) or (time, y, x)
+    fields = dict(thk=thk, topg=np.repeat(topg[None], len(t), axis=0),
+                  usurf=usurf, uvelsurf=u, vvelsurf=v, velsurf_mag=c,
+                  mask=mask)
+    if order == 'yx':
+        fields = {k: f.transpose(0, 2, 1) for k, f in fields.items()}
+    return fields
+
+
+def make_dataset(filename, nx=101, ny=101, nt=11, nfiles=1, order='xy',
+                 zlib=False, t0=-20e3, t1=0.0):
+    """Write a synthetic PISM-like dataset and return the list of files.
+
+    If *nfiles* is larger than one the time records are split over several
+    files named after *filename* with a numeric suffix, suitable for opening
+    as a multi-file dataset.
+    """
+
+    # prepare coordinates
+    x = np.linspace(-1e6, 1e6, nx)
+    y = np.linspace(-1e6*ny/nx, 1e6*ny/nx, ny)
+    t = np.linspace(t0, t1, nt)
+    fields = _fields(x, y, t-t0, order)
+    dims = ('time', 'x', 'y') if order == 'xy' else ('time', 'y', 'x')
+
+    # split records over files
+    if nfiles > 1:
+        root, ext = filename.rsplit('.', 1) if '.' in filename else (
+            filename, 'nc')
+        filenames = ['%s-%03d.%s' % (root, i, ext) for i in range(nfiles)]
+    else:
+        filenames = [filename]
+    chunks = np.array_split(np.arange(nt), len(filenames))
+
+    # write each file
+    for fname, idx in zip(filenames, chunks):
+        nc = Dataset(fname, 'w', format='NETCDF4_CLASSIC')
+        nc.createDimension('time', None)
+        nc.createDimension('x', nx)
+        nc.createDimension('y', ny)
+        var = nc.createVariable('x', 'f8', ('x',))
+        var.units = 'm'
+        var[:] = x
+        var = nc.createVariable('y', 'f8', ('y',))
+        var.units = 'm'
+        var[:] = y
+        var = nc.createVariable('time', 'f8', ('time',))
+        var.units = 'seconds since 1-1-1'
+        var[:] = t[idx]*yr2s
+        for varname, field in sorted(fields.items()):
+            dtype = 'i1' if varname == 'mask' else 'f4'
+            var = nc.createVariable(varname, dtype, dims, zlib=zlib)
+            var[:] = field[idx]
+        nc.close()
+
+    # return file names
+    return filenames
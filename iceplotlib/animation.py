@@ -3,9 +3,11 @@
 Draw animations.
 """
 
+import os
+import time
+
 from matplotlib.animation import FFMpegFileWriter, FuncAnimation
-from iceplotlib.io import yr2s
-from iceplotlib.plot import gca
+from iceplotlib.io import IceDataset, yr2s
 
 ### Customized MovieWriter class ###
 
@@ -28,7 +30,8 @@ class IceWriter(FFMpegFileWriter):
 def _animate_icedataset_method(name):
     """Transform a plotting method into an animation function"""
     def func(nc, *args, **kwargs):
-        ax = gca()
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
         frames = kwargs.pop('frames', nc.variables['time'][:]/yr2s)
         def update(t):
             ax.cla()
@@ -38,3 +41,127 @@ def _animate_icedataset_method(name):
     return func
 
 iceanim = _animate_icedataset_method('icemap')
+
+
+def iceanim_rgba(nc, ax=None, **kwargs):
+    """Animate ice maps composited in NumPy by updating a single image.
+
+    This is a faster alternative to :func:`iceanim` that draws no contours.
+    Keyword arguments are passed to :func:`iceplotlib.render.icemap_rgba`.
+    """
+    import matplotlib.pyplot as plt
+    from iceplotlib.render import icemap_rgba, show_rgba
+    ax = ax or plt.gca()
+    frames = kwargs.pop('frames', nc.variables['time'][:]/yr2s)
+    im = show_rgba(nc, icemap_rgba(nc, t=frames[0], **kwargs), ax=ax)
+    def update(t):
+        im.set_data(icemap_rgba(nc, t=t, **kwargs))
+        return im,
+    return FuncAnimation(ax.figure, update, frames)
+
+
+### Live animations ###
+
+class IceFollower(object):
+    """Follow a growing PISM output file and render new frames only.
+
+    The file is polled for new time records, which are appended to the
+    ``frames`` time index in place. Only frames not rendered yet are drawn,
+    then passed to an open movie *writer* and/or saved to an image
+    sequence following *pattern*, e.g. ``'frames/%05d.png'``. Images
+    already present in the sequence are never recomputed, so that following
+    can resume after a restart. Further keyword arguments are passed to the
+    plotting *method*.
+    """
+
+    def __init__(self, filename, method='icemap', ax=None, writer=None,
+                 outfile=None, pattern=None, dpi=None, **kwargs):
+        import matplotlib.pyplot as plt
+        self.filename = filename
+        self.method = method
+        self.ax = ax or plt.gca()
+        self.writer = writer
+        self.outfile = outfile
+        self.pattern = pattern
+        self.dpi = dpi
+        self.kwargs = kwargs
+        self.frames = []
+        self.rendered = 0
+        self.nc = None
+        self._writing = False
+
+    def poll(self, final=False):
+        """Reopen the file and read new time records only.
+
+        PISM extends the time axis before writing the fields of a record,
+        so the newest record is held back until a later one appears, unless
+        *final* is true. Returns the number of new records. The file is
+        left open for rendering until the next call to :meth:`update`.
+        """
+        if self.nc is not None:
+            self.nc.close()
+        self.nc = IceDataset(self.filename)
+        times = self.nc.variables['time']
+        complete = len(times) if final else len(times)-1
+        count = complete - len(self.frames)
+        if count > 0:
+            self.frames.extend(times[len(self.frames):complete]/yr2s)
+        return max(count, 0)
+
+    def update(self, final=False):
+        """Poll the file and render frames for new records.
+
+        The file is closed again after rendering, so that the model can
+        keep writing to it. Returns the number of frames rendered.
+        """
+        self.poll(final=final)
+        fig = self.ax.figure
+        count = 0
+        for i in range(self.rendered, len(self.frames)):
+            filename = self.pattern and self.pattern % i
+            if filename and os.path.isfile(filename) and not self.writer:
+                continue
+            self.ax.cla()
+            getattr(self.nc, self.method)(ax=self.ax, t=self.frames[i],
+                                          **self.kwargs)
+            if self.writer is not None:
+                if not self._writing:
+                    self.writer.setup(fig, self.outfile, self.dpi)
+                    self._writing = True
+                self.writer.grab_frame()
+            if filename and not os.path.isfile(filename):
+                fig.savefig(filename, dpi=self.dpi)
+            count += 1
+        self.rendered = len(self.frames)
+        self.nc.close()
+        self.nc = None
+        return count
+
+    def run(self, interval=60.0, timeout=None):
+        """Keep rendering new frames until no record came for *timeout* s.
+
+        Follow indefinitely if *timeout* is None, until interrupted. The
+        newest record is rendered on timeout, once the file stopped growing.
+        """
+        last = time.time()
+        try:
+            while True:
+                if self.update():
+                    last = time.time()
+                elif timeout is not None and time.time()-last > timeout:
+                    self.update(final=True)
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.finish()
+
+    def finish(self):
+        """Finish the movie and close the file."""
+        if self._writing:
+            self.writer.finish()
+            self._writing = False
+        if self.nc is not None:
+            self.nc.close()
+            self.nc = None
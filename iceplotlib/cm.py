@@ -1,12 +1,14 @@
 """:mod:`iceplotlib.cm`
 
 Provide custom colormaps.
-"""
 
-from matplotlib.colors import LinearSegmentedColormap
+Colormaps are built on first access from the color lists below, so that
+importing this module does not require matplotlib.
+"""
 
 def _cmap_from_list(name, colors):
     """Create a linear colormap from a non-normalized color list"""
+    from matplotlib.colors import LinearSegmentedColormap
     if len(colors[0]) == 2:
         bounds, colors = zip(*colors)
         bmin = bounds[0]
@@ -29,7 +31,6 @@ _sea_topo_clist = [
     ( -100., '#c6ecff'),
     (    0., '#d8f2fe')]
 
-sea_topo = _cmap_from_list('sea_topo', _sea_topo_clist)
 
 _land_topo_clist = [
 (   0., '#acd0a5'),
@@ -47,21 +48,34 @@ _land_topo_clist = [
 (4000., '#b9985a'),
 (6000., '#aa8753')]
 
-land_topo = _cmap_from_list('land_topo', _land_topo_clist)
 
 _topo_clist = _sea_topo_clist + _land_topo_clist
 
-topo = _cmap_from_list('topo', _topo_clist)
 
 # Other colormaps
 
 _velocity_clist = [
   '#ffffff', '#00ffff', '#ffff00', '#ff0000', '#000000']
 
-velocity = _cmap_from_list('velocity', _velocity_clist)
 
 # Transparent shadows colormap
 
 _shades_clist = [(0.0, (0,0,0,0)), (1.0, (0,0,0,1))]
 
-shades = _cmap_from_list('shades', _shades_clist)
+
+# Lazy colormap construction
+
+def __getattr__(name):
+    """Build colormaps on first access."""
+    if '_%s_clist' % name not in globals():
+        raise AttributeError('module %s has no attribute %s' % (
+            __name__, name))
+    clist = globals()['_%s_clist' % name]
+    cmap = globals()[name] = _cmap_from_list(name, clist)
+    return cmap
+
+
+def __dir__():
+    """List module attributes including colormaps not built yet."""
+    cmaps = [k[1:-6] for k in globals() if k.endswith('_clist')]
+    return sorted(set(globals()) | set(cmaps))
@@ -1,30 +1,49 @@
 """:mod:`iceplotlib.colors`
 
 Provide default color preferences for each variable.
+
+The ``default_cmaps`` and ``default_norms`` dictionaries are built on first
+access, so that importing this module does not build any colormap.
 """
 
-from matplotlib.colors import LinearSegmentedColormap, LogNorm, Normalize
-from iceplotlib.cm import land_topo, topo, velocity, shades
-
-default_cmaps = {
-    'air_temp':         'Spectral_r',
-    'precipitation':    'YlGnBu',
-    'temppabase':       'Blues_r',
-    'topg':             topo,
-    'thk':              'Blues_r',
-    'usurf':            land_topo,
-    'cbase':            velocity,
-    'csurf':            velocity,
-    'shading':          shades,
-}
-
-default_norms = {
-    'air_temp':         Normalize(-30,30),
-    'precipitation':    LogNorm(0.1,10),
-    'temppabase':       Normalize(-10, 0),
-    'topg':             Normalize(-6000,6000),
-    'cbase':            LogNorm(10, 10000),
-    'csurf':            LogNorm(10, 10000),
-    'usurf':            Normalize(0,6000),
-    'shading':          Normalize(0.0, 1.0),
-}
+
+def _default_cmaps():
+    from iceplotlib.cm import land_topo, topo, velocity, shades
+    return {
+        'air_temp':         'Spectral_r',
+        'precipitation':    'YlGnBu',
+        'temppabase':       'Blues_r',
+        'topg':             topo,
+        'thk':              'Blues_r',
+        'usurf':            land_topo,
+        'cbase':            velocity,
+        'csurf':            velocity,
+        'shading':          shades,
+        'icecover':         'Blues',
+        'exceedance':       'Reds',
+    }
+
+
+def _default_norms():
+    from matplotlib.colors import LogNorm, Normalize
+    return {
+        'air_temp':         Normalize(-30,30),
+        'precipitation':    LogNorm(0.1,10),
+        'temppabase':       Normalize(-10, 0),
+        'topg':             Normalize(-6000,6000),
+        'cbase':            LogNorm(10, 10000),
+        'csurf':            LogNorm(10, 10000),
+        'usurf':            Normalize(0,6000),
+        'shading':          Normalize(0.0, 1.0),
+        'icecover':         Normalize(0.0, 1.0),
+        'exceedance':       Normalize(0.0, 1.0),
+    }
+
+
+def __getattr__(name):
+    """Build default color preferences on first access."""
+    if name not in ('default_cmaps', 'default_norms'):
+        raise AttributeError('module %s has no attribute %s' % (
+            __name__, name))
+    value = globals()[name] = globals()['_'+name]()
+    return value
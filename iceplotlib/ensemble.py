@@ -0,0 +1,271 @@
+""":mod:`iceplotlib.ensemble`
+
+Compute statistics across ensembles of PISM runs on identical grids.
+
+Fields are streamed from each member in chunks of grid rows, so that memory
+use is bounded by the chunk size rather than the number of members. Means
+and variances are accumulated with mergeable one-pass formulas, quantiles
+are estimated from per-cell histograms, and ice-cover frequencies and
+exceedance probabilities are counted. Member reads run in parallel across
+processes.
+
+Results are returned as in-memory datasets holding each statistic under
+the original variable name, so that they can be drawn with the usual
+plotting methods and default colors::
+
+    ens = Ensemble('output/run-*.nc')
+    stats = ens.stats('thk', t=-20e3, threshold=500.0)
+    stats['q90'].imshow('thk')
+    stats['mean'].imshow('exceedance')
+"""
+
+import glob
+import itertools
+import multiprocessing
+
+import numpy as np
+import iceplotlib.colors as icolors
+from iceplotlib.io import IceDataset, yr2s
+
+# unique names for in-memory datasets
+_counter = itertools.count()
+
+
+# Accumulators
+# ------------
+
+def _empty(shape, nbins):
+    """Return empty accumulators for a chunk of given shape."""
+    return dict(n=np.zeros(shape, dtype=np.int32),
+                mean=np.zeros(shape), m2=np.zeros(shape),
+                hist=np.zeros((nbins+2,)+shape, dtype=np.int32),
+                ice=np.zeros(shape, dtype=np.int32),
+                exceed=np.zeros(shape, dtype=np.int32))
+
+
+def _merge(a, b):
+    """Merge two sets of accumulators using Chan's parallel formulas."""
+    n = a['n'] + b['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = b['mean'] - a['mean']
+        ratio = np.where(n > 0, b['n'] / np.maximum(n, 1.0), 0.0)
+        a['mean'] += delta*ratio
+        a['m2'] += b['m2'] + delta**2*a['n']*ratio
+    a['n'] = n
+    for key in ('hist', 'ice', 'exceed'):
+        a[key] += b[key]
+    return a
+
+
+def _accumulate(task):
+    """Accumulate statistics for a group of members over one chunk."""
+    (filenames, varname, t, thkth, window, edges, log, threshold) = task
+    shape = (window[0].stop-window[0].start, window[1].stop-window[1].start)
+    acc = _empty(shape, len(edges)-1)
+    for filename in filenames:
+        nc = IceDataset(filename, thkth=thkth)
+        z = nc._extract_xyz(varname, t, window=window)[2]
+        mask = nc._extract_mask(t, window=window)
+        nc.close()
+
+        # count ice cover and exceedance
+        valid = ~np.ma.getmaskarray(z)
+        z = np.ma.getdata(z).astype(np.float64)
+        valid &= np.isfinite(z)
+        if mask is not None:
+            acc['ice'] += ~np.ma.filled(mask, True)
+        if threshold is not None:
+            acc['exceed'] += valid & (z > threshold)
+
+        # update running mean and variance (Welford)
+        acc['n'] += valid
+        delta = np.where(valid, z-acc['mean'], 0.0)
+        acc['mean'] += delta/np.maximum(acc['n'], 1)
+        acc['m2'] += delta*np.where(valid, z-acc['mean'], 0.0)
+
+        # update histogram, with under and over bins at both ends
+        with np.errstate(invalid='ignore', divide='ignore'):
+            idx = np.searchsorted(edges, np.log(z) if log else z,
+                                  side='right')
+        rows, cols = np.nonzero(valid)
+        np.add.at(acc['hist'], (idx[valid], rows, cols), 1)
+    return acc
+
+
+def _extrema(task):
+    """Return the smallest and largest valid values over a group."""
+    filenames, varname, t, thkth = task
+    lo, hi = np.inf, -np.inf
+    for filename in filenames:
+        nc = IceDataset(filename, thkth=thkth)
+        z = nc._extract_xyz(varname, t)[2]
+        nc.close()
+        z = np.ma.masked_invalid(np.ma.asarray(z, dtype=np.float64))
+        if z.count():
+            lo, hi = min(lo, z.min()), max(hi, z.max())
+    return lo, hi
+
+
+def _quantiles(hist, edges, log, quantiles):
+    """Estimate quantiles from cumulative per-cell histograms."""
+    cdf = np.cumsum(hist, axis=0)
+    n = cdf[-1]
+    results = []
+    for q in quantiles:
+        target = q*n
+        idx = np.clip((cdf < target[None]).sum(axis=0), 1, len(edges)-1)
+        lower = np.take_along_axis(cdf, idx[None]-1, axis=0)[0]
+        count = np.take_along_axis(hist, idx[None], axis=0)[0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.clip((target-lower)/count, 0.0, 1.0)
+        frac = np.where(count > 0, frac, 0.0)
+        z = edges[idx-1] + frac*(edges[idx]-edges[idx-1])
+        results.append(np.exp(z) if log else z)
+    return results
+
+
+# Ensemble class
+# --------------
+
+class Ensemble(object):
+    """Ensemble of PISM runs with identical grids."""
+
+    def __init__(self, pattern, thkth=1.0):
+        self.filenames = sorted(glob.glob(pattern))
+        if len(self.filenames) == 0:
+            raise RuntimeError('could not load %s' % pattern)
+        self.thkth = thkth
+        nc = IceDataset(self.filenames[0])
+        self.x = nc.variables['x'][:]
+        self.y = nc.variables['y'][:]
+        nc.close()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def _get_edges(self, varname, t, bins, range, groups, map=map):
+        """Return histogram bin edges and whether these are logarithmic.
+
+        Without a default norm, the range spans values across all members,
+        found in a first pass over groups of members using *map*.
+        """
+        norm = icolors.default_norms.get(varname)
+        log = norm.__class__.__name__ == 'LogNorm' if range is None else False
+        if range is None and norm is not None:
+            range = norm.vmin, norm.vmax
+        elif range is None:
+            extrema = list(map(_extrema, [(group, varname, t, self.thkth)
+                                          for group in groups]))
+            range = (min(lo for lo, hi in extrema),
+                     max(hi for lo, hi in extrema))
+            if not np.isfinite(range).all():  # no valid values
+                range = 0.0, 1.0
+        if log:
+            range = np.log(range[0]), np.log(range[1])
+        return np.linspace(range[0], range[1], bins+1), log
+
+    def stats(self, varname, t=None, quantiles=(0.1, 0.5, 0.9),
+              threshold=None, bins=64, range=None, chunk=64,
+              processes=None):
+        """Compute ensemble statistics for a variable at a given time.
+
+        Parameters
+        ----------
+        varname : str
+            Variable name, e.g. ``thk`` or ``velsurf_mag``. Ice-free cells
+            are excluded from the statistics except for ``topg``.
+        t : float or str, optional
+            Time in years, or a keyword understood by the plotting methods.
+        quantiles : sequence of float, optional
+            Quantiles estimated from histograms with *bins* bins over
+            *range*. The default range is set from the variable's default
+            norm, or else from the extreme values across all members.
+            Quantiles of values outside an explicit range are clipped to
+            its ends.
+        threshold : float, optional
+            Value for which to compute exceedance probabilities.
+        chunk : int, optional
+            Number of grid rows read from each member at once. Histograms
+            are only kept for the chunk being merged.
+        processes : int, optional
+            Number of worker processes. Members are read serially in the
+            current process if 1, and by as many workers as cores if None.
+
+        Returns a dictionary of in-memory datasets keyed by ``mean``,
+        ``std`` and quantile names such as ``q10`` and ``q90``. Each
+        holds the statistic under *varname*, the ice-cover frequency as
+        ``icecover``, a majority ice-cover ``mask``, the member count
+        ``n`` and, if a threshold was given, the exceedance probability as
+        ``exceedance``.
+        """
+        nx, ny = len(self.x), len(self.y)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        groups = [list(g) for g in np.array_split(
+            self.filenames, min(processes, len(self))) if len(g)]
+        names = ['q%02d' % round(q*100) for q in quantiles]
+        stats = {name: np.zeros((ny, nx)) for name in ['mean', 'std']+names}
+        totals = {k: np.zeros((ny, nx), dtype=np.int32)
+                  for k in ('n', 'ice', 'exceed')}
+
+        # prepare tasks for each chunk of rows and group of members
+        windows = [(slice(j, min(j+chunk, ny)), slice(0, nx))
+                   for j in np.arange(0, ny, chunk)]
+        pool = processes != 1 and multiprocessing.Pool(processes)
+        try:
+            edges, log = self._get_edges(varname, t, bins, range, groups,
+                                         map=pool.map if pool else map)
+            tasks = [(group, varname, t, self.thkth, window, edges, log,
+                      threshold) for window in windows for group in groups]
+
+            # accumulate statistics in serial or in parallel, reducing
+            # each chunk once all groups of members are merged
+            results = (pool.imap(_accumulate, tasks) if pool else
+                       map(_accumulate, tasks))
+            part = None
+            for i, res in enumerate(results):
+                part = res if part is None else _merge(part, res)
+                if (i+1) % len(groups):
+                    continue
+                window = windows[i//len(groups)]
+                n = part['n']
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    stats['mean'][window] = part['mean']
+                    stats['std'][window] = (part['m2'] /
+                                            np.maximum(n-1, 1))**0.5
+                for name, z in zip(names, _quantiles(
+                        part['hist'], edges, log, quantiles)):
+                    stats[name][window] = z
+                for k in totals:
+                    totals[k][window] = part[k]
+                part = None
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        # compute final statistics
+        n = totals['n']
+        shared = dict(n=n, icecover=totals['ice']/float(len(self)))
+        if threshold is not None:
+            shared['exceedance'] = totals['exceed']/float(len(self))
+        shared['mask'] = np.where(shared['icecover'] >= 0.5, 2, 0)
+        time = t*yr2s if t is not None and not isinstance(t, str) else 0.0
+        return {name: self._to_dataset(name, varname, z, n, time, shared)
+                for name, z in stats.items()}
+
+    def _to_dataset(self, name, varname, z, n, time, shared):
+        """Build an in-memory dataset holding one statistic."""
+        filename = 'ensemble-%s-%s-%d.nc' % (varname, name, next(_counter))
+        nc = IceDataset(filename, mode='w', diskless=True, thkth=None)
+        nc.createDimension('time', None)
+        nc.createDimension('x', len(self.x))
+        nc.createDimension('y', len(self.y))
+        for dim, values in (('x', self.x), ('y', self.y), ('time', [time])):
+            nc.createVariable(dim, 'f8', (dim,))[:] = values
+        z = np.ma.masked_where(n == 0, z)
+        for key, values in dict(shared, **{varname: z}).items():
+            var = nc.createVariable(key, 'i1' if key == 'mask' else 'f4',
+                                    ('time', 'y', 'x'))
+            var[0] = values
+        return nc
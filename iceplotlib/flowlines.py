@@ -4,12 +4,22 @@ Compute various types of flowlines.
 """
 
 import numpy as np
-from netCDF4 import Dataset
-from scipy.interpolate import RegularGridInterpolator
+
+
+def _read_component(nc, varname, index=slice(None)):
+    """Read a velocity component in the dataset working precision.
+
+    Plain netCDF4 datasets are read in their default precision.
+    """
+    var = nc.variables[varname]
+    z = var[index]
+    astype = getattr(nc, '_astype', None)
+    return z if astype is None else astype(z, var)
 
 
 def pathline(nc, varname, origin, t=None, dt=10.0, n=101,
                thkth=None, **kwargs):
+    from scipy.interpolate import RegularGridInterpolator
 
     # extract 3d data
     # FIXME move this somewhere else
@@ -17,8 +27,8 @@ def pathline(nc, varname, origin, t=None, dt=10.0, n=101,
     time = nc.variables['time'][:]*s2yr
     x = nc.variables['x'][:]
     y = nc.variables['y'][:]
-    u = nc.variables['uvelsurf'][:]
-    v = nc.variables['vvelsurf'][:]
+    u = _read_component(nc, 'uvelsurf')
+    v = _read_component(nc, 'vvelsurf')
 
     # build spatial interpolators
     u_interp = RegularGridInterpolator((time, x, y), u, bounds_error=False)
@@ -46,6 +56,7 @@ def pathline(nc, varname, origin, t=None, dt=10.0, n=101,
 
 def streamline(nc, varname, origin, t=None, dt=10.0, n=101,
                thkth=None, **kwargs):
+    from scipy.interpolate import RegularGridInterpolator
 
     # extract data
     # FIXME move this somewhere else
@@ -54,8 +65,8 @@ def streamline(nc, varname, origin, t=None, dt=10.0, n=101,
     tidx = np.argmin(np.abs(time-t))
     x = nc.variables['x'][:]
     y = nc.variables['y'][:]
-    u = nc.variables['uvelsurf'][tidx]
-    v = nc.variables['vvelsurf'][tidx]
+    u = _read_component(nc, 'uvelsurf', tidx)
+    v = _read_component(nc, 'vvelsurf', tidx)
 
     # build spatial interpolators
     u_interp = RegularGridInterpolator((x, y), u, bounds_error=False)
@@ -78,3 +89,207 @@ def streamline(nc, varname, origin, t=None, dt=10.0, n=101,
 
     # return dates and positions
     return dates, positions
+
+
+# Streamline layout
+# -----------------
+
+# bytes used to track cells crossed by each batch of streamlines
+_visited_bytes = 2**24
+
+
+def _spiral(nx, ny):
+    """Return mask cells from the outside inwards as (x, y) indices."""
+    cells = []
+    xfirst, yfirst, xlast, ylast = 0, 1, nx-1, ny-1
+    x, y, direction = 0, 0, 'right'
+    for i in range(nx*ny):
+        cells.append((x, y))
+        if direction == 'right':
+            x += 1
+            if x >= xlast:
+                xlast -= 1
+                direction = 'up'
+        elif direction == 'up':
+            y += 1
+            if y >= ylast:
+                ylast -= 1
+                direction = 'left'
+        elif direction == 'left':
+            x -= 1
+            if x <= xfirst:
+                xfirst += 1
+                direction = 'down'
+        elif direction == 'down':
+            y -= 1
+            if y <= yfirst:
+                yfirst += 1
+                direction = 'right'
+    return cells
+
+
+def _interp_grid(a, pos):
+    """Interpolate a grid bilinearly at positions in axes coordinates.
+
+    The grid may hold several components along a third axis.
+    """
+    ny, nx = a.shape[:2]
+    gx = pos[:, 0]*(nx-1)
+    gy = pos[:, 1]*(ny-1)
+    i = np.minimum(np.maximum(gx.astype(int), 0), nx-2)
+    j = np.minimum(np.maximum(gy.astype(int), 0), ny-2)
+    fx = gx - i
+    fy = gy - j
+    if a.ndim == 3:
+        fx = fx[:, None]
+        fy = fy[:, None]
+    return ((a[j, i]*(1-fx) + a[j, i+1]*fx)*(1-fy) +
+            (a[j+1, i]*(1-fx) + a[j+1, i+1]*fx)*fy)
+
+
+def _direction(uv, pos, sign):
+    """Return unit flow directions at positions in axes coordinates.
+
+    Directions are reversed where *sign* is negative.
+    """
+    d = _interp_grid(uv, pos)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return d / (sign*np.hypot(d[:, 0], d[:, 1]))[:, None]
+
+
+def _mask_cells(pos, shape):
+    """Return flat indices of mask cells at positions in axes coordinates."""
+    ny, nx = shape
+    return (np.rint(pos[:, 1]*(ny-1)).astype(int)*nx +
+            np.rint(pos[:, 0]*(nx-1)).astype(int))
+
+
+def _integrate(uv, seeds, ds, nsteps, sign, mask):
+    """Integrate streamlines from many seeds at once by midpoint steps.
+
+    Streamlines are integrated backward where *sign* is negative and
+    forward where it is positive. Each streamline stops when leaving the
+    grid, entering an area of missing or zero velocity, or entering a cell
+    of the boolean *mask* either occupied already or crossed earlier by the
+    same streamline.
+    Returns a list of trajectories in axes coordinates.
+    """
+    traj = np.full((nsteps+1, len(seeds), 2), np.nan)
+    traj[0] = seeds
+    pos = np.array(seeds, dtype=float)
+    active = np.arange(len(seeds))
+    sign = np.broadcast_to(sign, len(seeds))
+    lengths = np.ones(len(seeds), dtype=int)
+    cells = _mask_cells(pos, mask.shape)
+    visited = np.zeros((len(seeds), mask.size), dtype=bool)
+    visited[active, cells] = True
+    for i in range(nsteps):
+
+        # compute midpoint step, stopping on missing velocities
+        k1 = _direction(uv, pos, sign[active])
+        valid = np.isfinite(k1).all(axis=1)
+        if not valid.all():
+            active, pos, cells, k1 = (active[valid], pos[valid],
+                                      cells[valid], k1[valid])
+        pos = pos + ds*_direction(uv, pos + 0.5*ds*k1, sign[active])
+
+        # stop outside the grid and in occupied cells
+        with np.errstate(invalid='ignore'):
+            valid = ((pos >= 0) & (pos <= 1)).all(axis=1)
+        active, pos, cells = active[valid], pos[valid], cells[valid]
+        new = _mask_cells(pos, mask.shape)
+        valid = (new == cells) | ~(mask.flat[new] | visited[active, new])
+        active, pos, cells = active[valid], pos[valid], new[valid]
+        if len(active) == 0:
+            break
+        visited[active, cells] = True
+        traj[i+1, active] = pos
+        lengths[active] += 1
+    return [traj[:n, k] for k, n in enumerate(lengths)]
+
+
+def _walk(traj, mask):
+    """Cut a trajectory entering an occupied mask cell, marking the others.
+
+    Returns the number of points kept and the flat indices of newly
+    marked mask cells.
+    """
+    cells = _mask_cells(traj, mask.shape)
+    change = np.flatnonzero(cells[1:] != cells[:-1]) + 1
+    entered = cells[change]
+    blocked = np.flatnonzero(mask.flat[entered])
+    if len(blocked):
+        keep = change[blocked[0]]
+        entered = entered[:blocked[0]]
+    else:
+        keep = len(traj)
+    mask.flat[entered] = True
+    return keep, entered
+
+
+def streamline_layout(x, y, u, v, density=1.0, minlength=0.1,
+                      maxlength=4.0, chunk=None):
+    """Place and integrate evenly spaced streamlines.
+
+    Seeds are placed on a mask grid of ``30*density`` cells per axis,
+    following the same spiral order and spacing rules as matplotlib's
+    streamplot: each streamline stops when entering a mask cell already
+    crossed by another, and streamlines shorter than *minlength* are
+    discarded. Lengths are given in axes coordinates.
+
+    Streamlines are integrated as vectorized batches of *chunk* seeds
+    whose start cell is still free, by default as many as fit in about
+    16 MB of bookkeeping. Returns a list of (n, 2) arrays in data
+    coordinates.
+    """
+
+    # velocities in axes coordinates with missing values as nan, in the
+    # precision of the fields but at least single precision
+    u = np.ma.asarray(u)
+    v = np.ma.asarray(v)
+    ftype = np.result_type(u.dtype, v.dtype, np.float32).type
+    uv = np.ma.filled(np.ma.stack((
+        u.astype(ftype)/ftype(x[-1]-x[0]),
+        v.astype(ftype)/ftype(y[-1]-y[0])), axis=-1), np.nan)
+
+    # mask grid and integration step
+    mnx, mny = (30*np.broadcast_to(density, 2)).astype(int)
+    mask = np.zeros((mny, mnx), dtype=bool)
+    ds = min(1.0/mnx, 1.0/mny, 0.1)
+    nsteps = int(maxlength/ds)
+    chunk = chunk or min(max(_visited_bytes//(2*mask.size), 1), 1024)
+
+    # integrate by batch and keep streamlines in seed order
+    cells = _spiral(mnx, mny)
+    lines = []
+    for start in range(0, len(cells), chunk):
+        batch = [(i, j) for i, j in cells[start:start+chunk]
+                 if not mask[j, i]]
+        if not batch:
+            continue
+        seeds = np.array(batch, dtype=float) / [mnx-1, mny-1]
+        sign = np.repeat([-1, 1], len(batch))
+        results = _integrate(uv, np.concatenate((seeds, seeds)), ds, nsteps,
+                             sign, mask)
+
+        # accept streamlines in order as matplotlib does
+        for k, (i, j) in enumerate(batch):
+            if mask[j, i]:
+                continue
+            mask[j, i] = True
+            marked = [j*mnx+i]
+            keep = []
+            for traj in (results[k], results[len(batch)+k]):
+                n, entered = _walk(traj, mask)
+                marked.extend(entered)
+                keep.append(traj[:n])
+            npoints = len(keep[0]) + len(keep[1]) - 1
+            if npoints < 2 or ds*(npoints-1) < minlength:
+                mask.flat[marked] = False
+                continue
+            lines.append(np.concatenate((keep[0][::-1], keep[1][1:])))
+
+    # convert to data coordinates
+    return [np.column_stack((x[0] + line[:, 0]*(x[-1]-x[0]),
+                             y[0] + line[:, 1]*(y[-1]-y[0])))
+            for line in lines]
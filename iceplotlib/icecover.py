@@ -0,0 +1,190 @@
+""":mod:`iceplotlib.icecover`
+
+Precompute ice-cover masks for all frames as a packed-bit cube.
+
+Ice-cover masks are otherwise recomputed from thickness fields on every
+plotting call. An ice-cover cube is a directory holding one bit per grid
+cell and record, set where the cell is ice-free, packed along grid rows
+into a memory-mapped ``.npy`` file, i.e. a 32-fold reduction compared to
+float32 thickness. Datasets opened with an ``icecover`` argument use it for
+all masking in the plotting methods at their ice thickness threshold::
+
+    nc = iplt.load('run.nc', icecover='run-icecover')
+    nc.icemap(t=-10e3)
+    nc.icecover.deglaciation_time()
+
+Maps derived from the whole run, such as ice-cover duration and
+deglaciation time, are computed from the cube alone. The cube is rebuilt
+automatically when its source files or thickness threshold change.
+"""
+
+import json
+import os
+
+import numpy as np
+from iceplotlib.io import _contiguous_slices, _read_lock, yr2s
+from iceplotlib.store import _sources
+
+# version of the cube layout
+_version = 1
+
+# maximum number of bytes unpacked at once
+_chunk_bytes = 2**26
+
+
+class IceCover(object):
+    """Memory-mapped packed-bit ice-cover cube opened read-only."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+        self.path = path
+        self.thkth = self.index['thkth']
+        self.shape = tuple(self.index['shape'])
+        self.time = np.array(self.index['time'])
+        self.bits = np.load(os.path.join(path, 'icecover.npy'),
+                            mmap_mode='r')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def mask(self, record, window=None):
+        """Return the ice-free mask of a record as a boolean array.
+
+        If *window* is given as a pair of (y, x) slices, only the rows
+        within the window are unpacked.
+        """
+        if window is None:
+            window = slice(None), slice(None)
+        rows = self.bits[record, window[0]]
+        return np.unpackbits(rows, axis=-1, count=self.shape[2]).astype(
+            bool)[:, window[1]]
+
+    def _iter_chunks(self):
+        """Iterate over record offsets and unpacked ice-free masks."""
+        chunk = max(_chunk_bytes // (self.shape[1]*self.shape[2]), 1)
+        for start in range(0, len(self), chunk):
+            bits = self.bits[start:start+chunk]
+            yield start, np.unpackbits(bits, axis=-1,
+                                       count=self.shape[2]).astype(bool)
+
+    def duration(self):
+        """Return the total ice-cover duration of each cell in years.
+
+        Each record is assumed to represent the time span between the
+        midpoints to its neighbours.
+        """
+        edges = np.concatenate(([self.time[0]],
+                                (self.time[1:]+self.time[:-1])/2,
+                                [self.time[-1]]))
+        weights = np.diff(edges)
+        total = np.zeros(self.shape[1:])
+        for start, free in self._iter_chunks():
+            w = weights[start:start+len(free)]
+            total += np.tensordot(w, ~free, axes=1)
+        return total
+
+    def first_icefree(self):
+        """Return the time of the first ice-free record of each cell.
+
+        Cells never ice-free are masked.
+        """
+        first = np.full(self.shape[1:], -1)
+        for start, free in self._iter_chunks():
+            found = free.any(axis=0) & (first < 0)
+            first[found] = start + free.argmax(axis=0)[found]
+        return np.ma.masked_where(first < 0, self.time[first])
+
+    def deglaciation_time(self):
+        """Return the time each cell last became ice-free.
+
+        Cells ice-covered at the last record or never ice-covered are
+        masked.
+        """
+        last = np.full(self.shape[1:], -1)
+        for start, free in self._iter_chunks():
+            covered = ~free
+            found = covered.any(axis=0)
+            last[found] = (start + len(free) - 1 -
+                           covered[::-1].argmax(axis=0)[found])
+        free = (last >= 0) & (last < len(self)-1)
+        return np.ma.masked_where(~free, self.time[np.minimum(last+1,
+                                                              len(self)-1)])
+
+
+def _get_source(nc, thkth=None):
+    """Return the variable masks are computed from and the threshold."""
+    if thkth is not None and 'thk' in nc.variables:
+        return 'thk', thkth
+    elif 'mask' in nc.variables:
+        return 'mask', None
+    raise ValueError('no thk or mask variable to compute ice cover')
+
+
+def is_current(path, filenames, thkth):
+    """Check whether a cube is up to date for a given threshold."""
+    try:
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return False
+    return (index.get('version') == _version and
+            index.get('sources') == _sources(filenames) and
+            index.get('thkth') == thkth)
+
+
+def build(nc, path, filenames, thkth=None):
+    """Compute ice-free masks of all records into a packed-bit cube.
+
+    Masks are computed from ice thickness below *thkth*, or from the PISM
+    mask variable if *thkth* is None or thickness is missing, as in the
+    plotting methods. Records are processed by chunks, so that memory use
+    stays bounded.
+    """
+
+    # select variable and prepare directory
+    varname, thkth = _get_source(nc, thkth)
+    var = nc._get_variable(varname)
+    transpose = var.dimensions[-2:] == ('x', 'y')
+    nt = len(var) if len(var.shape) == 3 else 1
+    ny, nx = var.shape[-2:][::-1] if transpose else var.shape[-2:]
+    index = os.path.join(path, 'index.json')
+    if os.path.isfile(index):
+        os.remove(index)
+    elif not os.path.isdir(path):
+        os.makedirs(path)
+
+    # compute and pack masks by chunk of records
+    filename = os.path.join(path, 'icecover.npy')
+    bits = np.lib.format.open_memmap(
+        filename+'.tmp', mode='w+', dtype=np.uint8,
+        shape=(nt, ny, (nx+7)//8))
+    chunk = max(_chunk_bytes // (8*nx*ny), 1)
+    for s in _contiguous_slices(np.arange(nt), chunk):
+        with _read_lock:
+            z = var[s] if len(var.shape) == 3 else var[:][None]
+        if transpose:
+            z = np.ma.asarray(z).transpose(0, 2, 1)
+        if varname == 'thk':
+            free = z < thkth
+        else:
+            free = (z == 0) | (z == 4)
+        bits[s] = np.packbits(np.ma.filled(free, True), axis=-1)
+    bits.flush()
+    del bits
+    os.replace(filename+'.tmp', filename)  # keep open maps valid
+
+    # write index last so that interrupted conversions are rebuilt
+    time = nc.variables['time'][:]/yr2s if 'time' in nc.variables else [0.0]
+    meta = dict(version=_version, sources=_sources(filenames), thkth=thkth,
+                shape=[nt, ny, nx], time=[float(t) for t in time][:nt])
+    with open(index, 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def open_icecover(nc, path, filenames, thkth=None):
+    """Open an ice-cover cube, building it first if missing or outdated."""
+    thkth = _get_source(nc, thkth)[1]
+    if not is_current(path, filenames, thkth):
+        build(nc, path, filenames, thkth=thkth)
+    return IceCover(path)
@@ -3,74 +3,535 @@
 Provide an interface to PISM NetCDF files.
 """
 
-import matplotlib.pyplot as plt
+import contextlib
+import threading
+import warnings
+
 import numpy as np
 from netCDF4 import Dataset, MFDataset
-from iceplotlib.colors import default_cmaps, default_norms
+import iceplotlib.colors as icolors
 
 # convert seconds to year
 # FIXME: perform conversion using UDUnits instead
 yr2s = 365.0 * 24 * 60 * 60
 
+# the netcdf library is not thread-safe
+_read_lock = threading.RLock()
+
+# calendar months for each season and month keyword
+_seasons = dict(djf=(12, 1, 2), mam=(3, 4, 5), jja=(6, 7, 8),
+                son=(9, 10, 11))
+_seasons.update((name, (i+1,)) for i, name in enumerate([
+    'jan', 'feb', 'mar', 'apr', 'may', 'jun',
+    'jul', 'aug', 'sep', 'oct', 'nov', 'dec']))
+
+# maximum number of records read at once when averaging
+_season_chunk = 12
+
+# streamplot options drawn with matplotlib
+_mpl_streamplot_kw = ('start_points', 'integration_direction',
+                      'broken_streamlines', 'num_arrows',
+                      'integration_max_step_scale',
+                      'integration_max_error_scale')
+
+# maximum number of (variable, window) record buffers per dataset
+_record_buffer_size = 16
+
+# maximum number of cached streamline layouts per dataset
+_streamline_cache_size = 64
+
+# maximum number of bytes read at once when extracting points
+_point_bytes = 2**26
+
 
 def _get_map_axes(ax=None):
-    ax = ax or plt.gca()
+    if ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
     ax.set_aspect(1.0)
     ax.xaxis.set_visible(False)
     ax.yaxis.set_visible(False)
     return ax
 
 
+def _get_extent(x, y):
+    """Return image extent from cell-centered coordinates."""
+    w = (3*x[0]-x[1])/2
+    e = (3*x[-1]-x[-2])/2
+    n = (3*y[0]-y[1])/2
+    s = (3*y[-1]-y[-2])/2
+    return w, e, n, s
+
+
+def _warp_image(ax, x, y, z, kwargs):
+    """Reproject an image drawn with a different cartopy transform.
+
+    Returns the image and keyword arguments updated to draw it directly in
+    the axes projection, using a cached warp plan.
+    """
+    projection = getattr(ax, 'projection', None)
+    transform = kwargs.get('transform')
+    if (projection is None or not hasattr(transform, 'transform_points') or
+            transform == projection):
+        return z, kwargs
+    from iceplotlib.reproject import get_plan
+    kwargs.pop('extent', None)
+    plan = get_plan(x, y, kwargs.pop('transform'), projection,
+                    regrid_shape=kwargs.pop('regrid_shape', 750),
+                    target_extent=kwargs.pop('target_extent', None),
+                    cachedir=kwargs.pop('cachedir', None))
+    kwargs.update(transform=projection, extent=plan.extent, origin='lower')
+    return plan.apply(z), kwargs
+
+
+def _draw_streamlines(ax, x, y, lines, color=None, cmap=None, norm=None,
+                      linewidth=None, arrowsize=1, arrowstyle='-|>',
+                      transform=None, zorder=None):
+    """Draw streamlines with an arrow at their middle like matplotlib."""
+    import matplotlib as mpl
+    import matplotlib.collections as mcollections
+    import matplotlib.patches as mpatches
+    from matplotlib.streamplot import StreamplotSet
+    from iceplotlib.flowlines import _interp_grid
+
+    # prepare line collection
+    if transform is None:
+        transform = ax.transData
+    if zorder is None:
+        zorder = mpl.lines.Line2D.zorder
+    if linewidth is None:
+        linewidth = mpl.rcParams['lines.linewidth']
+    if color is None:
+        color = ax._get_lines.get_next_color()
+    use_array = np.ndim(color) == 2
+    segments = [np.stack((line[:-1], line[1:]), axis=1) for line in lines]
+    lc = mcollections.LineCollection(
+        np.concatenate(segments) if segments else np.empty((0, 2, 2)),
+        linewidth=linewidth, transform=transform, zorder=zorder)
+
+    # interpolate colors at segment starts
+    if use_array:
+        values = np.ma.asarray(color)
+        values = np.ma.filled(values.astype(np.result_type(
+            values.dtype, np.float32)), np.nan)
+        colors = [_interp_grid(values, np.column_stack((
+            (line[:-1, 0]-x[0])/(x[-1]-x[0]),
+            (line[:-1, 1]-y[0])/(y[-1]-y[0])))) for line in lines]
+        lc.set_array(np.ma.masked_invalid(np.concatenate(colors))
+                     if colors else np.empty(0))
+        lc.set_cmap(cmap)
+        lc.set_norm(norm)
+        lc.autoscale_None()
+        rgba = lc.to_rgba(lc.get_array())
+    else:
+        lc.set_color(color)
+    lc.sticky_edges.x[:] = [x.min(), x.max()]
+    lc.sticky_edges.y[:] = [y.min(), y.max()]
+    ax.add_collection(lc)
+
+    # add arrows at the middle of each streamline
+    arrows = []
+    offset = 0
+    for line in lines:
+        s = np.cumsum(np.hypot(*np.diff(line, axis=0).T))
+        n = min(np.searchsorted(s, s[-1]/2.0), len(line)-2)
+        kw = dict(arrowstyle=arrowstyle, mutation_scale=10*arrowsize,
+                  linewidth=linewidth, transform=transform, zorder=zorder,
+                  color=rgba[offset+n] if use_array else color)
+        p = mpatches.FancyArrowPatch(line[n], line[n:n+2].mean(axis=0),
+                                     **kw)
+        ax.add_patch(p)
+        arrows.append(p)
+        offset += len(line)-1
+
+    ax.autoscale_view()
+    ac = mcollections.PatchCollection(arrows)
+    return StreamplotSet(lc, ac)
+
+
+def _bilinear_weights(x, y, px, py):
+    """Return bilinear interpolation weights of points on a regular grid.
+
+    Returns the (y, x) window bounding the points, row and column indices
+    of the four surrounding cells relative to that window, their weights,
+    and whether each point lies within the grid.
+    """
+    gx = (np.asarray(px, dtype=float)-x[0]) / float(x[1]-x[0])
+    gy = (np.asarray(py, dtype=float)-y[0]) / float(y[1]-y[0])
+    valid = (gx >= 0) & (gx <= len(x)-1) & (gy >= 0) & (gy <= len(y)-1)
+    i = np.clip(np.floor(gx), 0, len(x)-2).astype(int)
+    j = np.clip(np.floor(gy), 0, len(y)-2).astype(int)
+    fx = np.clip(gx-i, 0, 1)
+    fy = np.clip(gy-j, 0, 1)
+    rows = np.stack((j, j, j+1, j+1), axis=-1)
+    cols = np.stack((i, i+1, i, i+1), axis=-1)
+    weights = np.stack(((1-fx)*(1-fy), fx*(1-fy), (1-fx)*fy, fx*fy), axis=-1)
+    weights[~valid] = 0.0
+
+    # restrict to the window bounding valid points
+    if valid.any():
+        r0, c0 = rows[valid].min(), cols[valid].min()
+        window = (slice(r0, rows[valid].max()+1),
+                  slice(c0, cols[valid].max()+1))
+    else:
+        r0, c0 = 0, 0
+        window = slice(0, 2), slice(0, 2)
+    rows = np.clip(rows-r0, 0, window[0].stop-r0-1)
+    cols = np.clip(cols-c0, 0, window[1].stop-c0-1)
+    return window, rows, cols, weights, valid
+
+
+def _is_continuous(var):
+    """Check whether a variable holds values that can be interpolated."""
+    if hasattr(var, 'continuous'):  # frame store variable
+        return var.continuous
+    with _read_lock:
+        return var.dtype.kind == 'f' or hasattr(var, 'scale_factor')
+
+
+def _window_key(window):
+    """Return a hashable key for a pair of slices, None for the full grid."""
+    if window is None or all(s == slice(None) for s in window):
+        return None
+    return tuple((s.start, s.stop, s.step) for s in window)
+
+
+def _contiguous_slices(indices, maxlen=None):
+    """Group sorted indices into slices of consecutive indices."""
+    slices = []
+    for run in np.split(indices, np.flatnonzero(np.diff(indices) != 1)+1):
+        for start in range(0, len(run), maxlen or max(len(run), 1)):
+            chunk = run[start:start+maxlen] if maxlen else run
+            slices.append(slice(int(chunk[0]), int(chunk[-1])+1))
+    return slices
+
+
+def _hillshade(x, y, z, azimuth=315, altitude=0):
+    """Compute hillshade values with zero on the lit side of slopes."""
+
+    # convert to rad from the x-axis
+    azimuth = (90-azimuth)*np.pi / 180.
+    altitude = altitude*np.pi / 180.
+
+    # compute cartesian coords of the illumination direction
+    # (scalars of the field type do not upcast single-precision fields)
+    ftype = np.result_type(z.dtype, np.float32).type
+    x0 = ftype(np.cos(azimuth) * np.cos(altitude))
+    y0 = ftype(np.sin(azimuth) * np.cos(altitude))
+    z0 = ftype(np.sin(altitude))
+    z0 = ftype(0.0)  # remove shades from horizontal surfaces
+
+    # compute hillshade (dot product of normal and light direction vectors)
+    dx = ftype(x[1] - x[0])
+    dy = ftype(y[1] - y[0])
+    u, v = np.gradient(z, dx, dy)
+    shade = (z0 - u*x0 - v*y0) / np.sqrt(ftype(1) + u*u + v*v)
+
+    # keep shadows only (white transparency is not possible)
+    return (shade > 0)*shade
+
+
 class IceDataset(Dataset):
-    """NetCDF Dataset with plotting methods."""
+    """NetCDF Dataset with plotting methods.
+
+    If *store* is given as a directory path, variables listed in *storevars*
+    (by default all variables on the grid) are read from a memory-mapped
+    frame store built there on first use (see :mod:`iceplotlib.store`).
+
+    Floating-point fields are converted to *dtype* if given, e.g.
+    ``'float32'``, or kept in their stored precision if ``'stored'``, so
+    that packed shorts are unpacked to float32 rather than float64.
+
+    If *icecover* is given as a directory path, ice-cover masks at the
+    *thkth* threshold are read from a packed-bit cube built there on first
+    use (see :mod:`iceplotlib.icecover`).
+
+    If *interp* is true, continuous fields requested at numeric times are
+    linearly interpolated between the two bracketing records instead of
+    taken from the nearest record. The last two records read for each
+    variable are kept in a buffer, so that successive frames between the
+    same records are computed without reading again.
+    """
+
+    def __init__(self, filename, thkth=1.0, store=None, storevars=None,
+                 dtype=None, interp=False, icecover=None, **kwargs):
+        with _read_lock:
+            Dataset.__init__(self, filename, **kwargs)
+            self.__dict__['thkth'] = thkth
+            self.__dict__['dtype'] = dtype
+            self.__dict__['interp'] = interp
+            self.__dict__['_records'] = {}
+            self._open_store(store, filename, storevars)
+            self._open_icecover(icecover, filename)
+
+    def _open_store(self, store, filenames, storevars=None):
+        """Open a memory-mapped frame store if a path is given."""
+        if store is not None:
+            from iceplotlib.store import open_store
+            store = open_store(self, store, filenames, varnames=storevars)
+        self.__dict__['store'] = store
+
+    def _open_icecover(self, icecover, filenames):
+        """Open a packed-bit ice-cover cube if a path is given."""
+        if icecover is not None:
+            from iceplotlib.icecover import open_icecover
+            icecover = open_icecover(self, icecover, filenames, self.thkth)
+        self.__dict__['icecover'] = icecover
+
+    # field cache used by cached() blocks
+    _cache = None
+
+    @contextlib.contextmanager
+    def cached(self):
+        """Cache extracted fields and masks within a block.
+
+        Inside the block each field is read once per time record, and each
+        ice-cover mask computed once, however many layers or panels use
+        them. Nested blocks share the outer cache.
+        """
+        if self._cache is not None:
+            yield self
+            return
+        self.__dict__['_cache'] = {}
+        try:
+            yield self
+        finally:
+            del self.__dict__['_cache']
+
+    def _get_time_key(self, t, var=None):
+        """Return record index for numeric times, or the time keyword.
+
+        Interpolated times are identified by their value instead, and
+        time-independent variables by None whatever the time.
+        """
+        with _read_lock:
+            if var is not None and len(var.shape) == 2:
+                return None
+            if t is None or isinstance(t, str):
+                return t
+            if self.interp and (var is None or _is_continuous(var)):
+                return 'interp', float(t)
+            time = self.variables['time'][:]
+        return int(((time-t*yr2s)**2).argmin())
+
+    def _get_requirements(self, method, *args, **kwargs):
+        """List fields and masks read by a plotting method.
+
+        Returns a list of ('field', varname) and ('mask', thkth) tuples.
+        """
+        varname = kwargs.get('varname', args[0] if args else None)
+        masks = [('mask', kwargs.get('thkth'))]
+        if method == 'icemap':
+            fields = ['topg', 'velsurf_mag', 'usurf']
+        elif method in ('icemargin', 'icemarginf'):
+            fields = []
+        elif method in ('quiver', 'streamplot'):
+            fields = ['u'+varname, 'v'+varname]
+            for cname in ['c'+varname.lstrip('vel'), varname+'_mag']:
+                if cname in self.variables:
+                    fields.append(cname)
+                    break
+        else:
+            fields = [varname]
+            if varname in ('mask', 'topg'):
+                masks = []
+        return [('field', f) for f in fields] + masks
 
-    def __init__(self, filename, thkth=1.0, **kwargs):
-        Dataset.__init__(self, filename, **kwargs)
-        self.__dict__['thkth'] = thkth
+    def _get_season_slices(self, season):
+        """Return contiguous record slices for a season or month keyword.
+
+        The index of calendar months is built once from the time variable,
+        using the midpoints of time bounds if available. The ``mean``
+        keyword covers all records and needs no calendar.
+        """
+        if season == 'mean':
+            with _read_lock:
+                nt = len(self.variables['time'])
+            return _contiguous_slices(np.arange(nt), _season_chunk)
+        if '_season_slices' not in self.__dict__:
+            from netCDF4 import num2date
+            time = self.variables['time']
+            with _read_lock:
+                bounds = getattr(time, 'bounds', None)
+                if bounds in self.variables:
+                    values = self.variables[bounds][:].mean(axis=1)
+                else:
+                    values = time[:]
+                units = getattr(time, 'units', None)
+                calendar = getattr(time, 'calendar', 'standard')
+            if units is None:
+                months = (values % yr2s / yr2s * 12).astype(int) + 1
+            else:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')  # year zero warnings
+                    dates = num2date(values, units, calendar)
+                months = np.array([d.month for d in np.ravel(dates)])
+            index = {}
+            for key, calmonths in _seasons.items():
+                records = np.flatnonzero(np.isin(months, calmonths))
+                index[key] = _contiguous_slices(records, _season_chunk)
+            self.__dict__['_season_slices'] = index
+        if len(self._season_slices[season]) == 0:
+            raise ValueError('no records in season %s' % season)
+        return self._season_slices[season]
 
     # data extraction methods
 
-    def _extract_2d(self, varname, t):
-        """Extract two-dimensional array from a netcdf variable."""
-        var = self.variables[varname]
-        time = self.variables['time']
-        if t == 'djf':
-            z = var[[12, 0, 1]].mean(axis=2)
-        elif t == 'mam':
-            z = var[2:5].mean(axis=2)
-        elif t == 'jja':
-            z = var[6:8].mean(axis=2)
-        elif t == 'son':
-            z = var[9:11].mean(axis=2)
-        elif t == 'mean':
-            z = var[:].mean(axis=2)
-        elif t is None or len(var.shape) == 2:
-            z = var[:].squeeze()
+    def _astype(self, z, var=None):
+        """Convert floating-point data to the working precision."""
+        if self.dtype is None or z.dtype.kind != 'f':
+            return z
+        elif isinstance(self.dtype, str) and self.dtype == 'stored':
+            dtype = np.result_type(var.dtype, np.float32)
         else:
-            tidx = ((time[:]-t*yr2s)**2).argmin()
-            z = var[tidx]
-        if var.dimensions[-2:] == ('x', 'y'):
+            dtype = np.dtype(self.dtype)
+        return z if z.dtype == dtype else z.astype(dtype)
+
+    def _get_variable(self, varname):
+        """Return a variable from the frame store if available."""
+        if self.store is not None and varname in self.store.variables:
+            return self.store.variables[varname]
+        return self.variables[varname]
+
+    def _extract_2d(self, varname, t, window=None):
+        """Extract two-dimensional array from a netcdf variable.
+
+        If *window* is given as a pair of (y, x) slices, only that part of
+        the grid is read from the file.
+        """
+        var = self._get_variable(varname)
+        with _read_lock:
+            key = varname, self._get_time_key(t, var), _window_key(window)
+            if self._cache is not None and key in self._cache:
+                return self._cache[key]
+            transpose = var.dimensions[-2:] == ('x', 'y')
+            ndim = len(var.shape)
+        if window is None:
+            window = slice(None), slice(None)
+        if transpose:
+            window = window[::-1]
+        window = tuple(window)
+        if ndim == 3 and (t == 'mean' or t in _seasons):
+            z = self._extract_average(var, self._get_season_slices(t),
+                                      window)
+        elif t is None or ndim == 2:
+            with _read_lock:
+                z = var[(Ellipsis,)+window].squeeze()
+        elif isinstance(key[1], tuple):
+            z = self._extract_interpolated(varname, var, t, window)
+        else:
+            with _read_lock:
+                z = var[(key[1],)+window]
+        if transpose:
             z = z.T
+        z = self._astype(z, var)
+        if self._cache is not None:
+            self._cache[key] = z
         return z
 
-    def _extract_mask(self, t, thkth=None):
+    def _extract_average(self, var, slices, window):
+        """Average records over contiguous slices in a single pass.
+
+        Sums are accumulated in double precision, but the result is
+        returned in the precision of the variable.
+        """
+        total = count = 0
+        for s in slices:
+            with _read_lock:
+                block = np.ma.asarray(var[(s,)+window])
+            total = total + block.astype(np.float64).filled(0).sum(axis=0)
+            count = count + block.count(axis=0)
+        z = (total/np.maximum(count, 1)).astype(
+            np.result_type(var.dtype, np.float32))
+        return np.ma.masked_where(count == 0, z)
+
+    def _extract_interpolated(self, varname, var, t, window):
+        """Interpolate linearly between the two records bracketing *t*.
+
+        Times outside the time axis are clipped to the first or last
+        record.
+        """
+        with _read_lock:
+            time = self.variables['time'][:]
+        i = min(max(int(np.searchsorted(time, t*yr2s)), 1), len(time)-1)
+        if len(time) == 1:
+            return self._read_record(varname, var, 0, window)
+        w = (t*yr2s-time[i-1]) / (time[i]-time[i-1])
+        w = min(max(float(w), 0.0), 1.0)
+        if w == 0.0:
+            return self._read_record(varname, var, i-1, window)
+        elif w == 1.0:
+            return self._read_record(varname, var, i, window)
+        z0 = self._read_record(varname, var, i-1, window)
+        z1 = self._read_record(varname, var, i, window)
+        ftype = np.result_type(z0.dtype, np.float32).type
+        return z0*ftype(1-w) + z1*ftype(w)
+
+    def _read_record(self, varname, var, i, window):
+        """Read a record through a two-slot buffer per variable.
+
+        Buffers of the least recently used variables and windows are
+        dropped beyond :data:`_record_buffer_size`.
+        """
+        with _read_lock:
+            key = varname, _window_key(tuple(window))
+            slots = self._records.pop(key, {})
+            self._records[key] = slots
+            if len(self._records) > _record_buffer_size:
+                del self._records[next(iter(self._records))]
+            if i not in slots:
+                if len(slots) == 2:
+                    del slots[max(slots, key=lambda j: abs(j-i))]
+                slots[i] = var[(i,)+window]
+            return slots[i]
+
+    def _get_cover(self, thkth):
+        """Return the ice-cover cube if it holds masks for a threshold."""
+        cover = self.icecover
+        if cover is None or 'time' not in self.variables:
+            return None
+        if thkth is None or 'thk' not in self.variables:
+            thkth = None
+        if cover.thkth == thkth:
+            return cover
+
+    def _get_cover_record(self, t, thkth):
+        """Return ice-cover cube record for a time and threshold, or None.
+
+        Interpolated and keyword times are not served from the cube.
+        """
+        record = self._get_time_key(t)
+        if self._get_cover(thkth) is not None and isinstance(record, int):
+            return record
+
+    def _extract_mask(self, t, thkth=None, window=None):
         """Extract ice-cover mask from a netcdf file."""
         t = t or 0  # if t is None use first time slice
         thkth = thkth or self.thkth
-        if thkth is not None and 'thk' in self.variables:
-            mask = self._extract_2d('thk', t)
+        if self._cache is not None:
+            key = 'mask', thkth, self._get_time_key(t), _window_key(window)
+            if key in self._cache:
+                return self._cache[key]
+        record = self._get_cover_record(t, thkth)
+        if record is not None:
+            mask = self.icecover.mask(record, window=window)
+        elif thkth is not None and 'thk' in self.variables:
+            mask = self._extract_2d('thk', t, window=window)
             mask = (mask < thkth)
         elif 'mask' in self.variables:
-            mask = self._extract_2d('mask', t)
+            mask = self._extract_2d('mask', t, window=window)
             mask = (mask == 0) + (mask == 4)
         else:
             mask = None
+        if self._cache is not None:
+            self._cache[key] = mask
         return mask
 
     def _extract_xyuvc(self, varname, t, thkth=None):
         """Extract coordinates and vector field from a netcdf file."""
-        x = self.variables['x'][:]
-        y = self.variables['y'][:]
+        with _read_lock:
+            x = self.variables['x'][:]
+            y = self.variables['y'][:]
         u = self._extract_2d('u'+varname, t)
         v = self._extract_2d('v'+varname, t)
         mask = self._extract_mask(t, thkth=thkth)
@@ -82,19 +543,204 @@ class IceDataset(Dataset):
                 c = np.ma.masked_where(mask, c)
                 break
         else:
-            c = (u**2 + v**2)**0.5
+            c = np.hypot(u, v)
         return x, y, u, v, c
 
-    def _extract_xyz(self, varname, t, thkth=None):
+    def _extract_xyz(self, varname, t, thkth=None, window=None):
         """Extract coordinates and scalar field from a netcdf file."""
-        x = self.variables['x'][:]
-        y = self.variables['y'][:]
-        z = self._extract_2d(varname, t)
+        if window is None:
+            window = slice(None), slice(None)
+        with _read_lock:
+            x = self.variables['x'][window[1]]
+            y = self.variables['y'][window[0]]
+        z = self._extract_2d(varname, t, window=window)
         if varname not in ('mask', 'topg'):
-            mask = self._extract_mask(t, thkth=thkth)
+            mask = self._extract_mask(t, thkth=thkth, window=window)
             z = np.ma.masked_where(mask, z)
         return x, y, z
 
+    def _interp_points(self, varname, points, records=None, chunk=None,
+                       nearest=False):
+        """Interpolate a variable at points for many time records.
+
+        The *points* are given as returned by :func:`_bilinear_weights`.
+        Only the window bounding the points is read, by contiguous slices
+        of at most *chunk* records, by default as many as fit in 64 MB.
+        Non-continuous variables, or all if *nearest* is true, are sampled
+        at the nearest cell. Returns a masked array of shape (records,
+        points) masked where any contributing cell is masked.
+        """
+        window, rows, cols, weights, valid = points
+        var = self._get_variable(varname)
+        with _read_lock:
+            transpose = var.dimensions[-2:] == ('x', 'y')
+            ndim, nt = len(var.shape), len(var)
+        window = window[::-1] if transpose else window
+        if nearest or not _is_continuous(var):
+            nearest = weights.argmax(axis=-1)
+            weights = np.zeros_like(weights)
+            weights[np.arange(len(weights)), nearest] = 1.0
+            weights[~valid] = 0.0
+
+        # read windows of contiguous records
+        if ndim == 2:
+            with _read_lock:
+                blocks = [var[window][None]]
+        else:
+            if records is None:
+                records = np.arange(nt)
+            size = (window[0].stop-window[0].start)*(
+                window[1].stop-window[1].start)
+            chunk = chunk or max(_point_bytes // (8*size), 1)
+            blocks = []
+            for s in _contiguous_slices(np.asarray(records), chunk):
+                with _read_lock:
+                    blocks.append(var[(s,)+window])
+
+        # gather weighted values at the points
+        values = []
+        for block in blocks:
+            if transpose:
+                block = np.ma.asarray(block).transpose(0, 2, 1)
+            block = self._astype(np.ma.asarray(block), var)
+            ftype = np.result_type(block.dtype, np.float32)
+            corners = block[:, rows, cols]
+            bad = np.ma.getmaskarray(corners) & (weights > 0)
+            z = (np.where(bad, 0, np.ma.getdata(corners)) *
+                 weights.astype(ftype)).sum(axis=-1)
+            values.append(np.ma.masked_where(bad.any(axis=-1) | ~valid, z))
+        if len(values) == 0:  # no records in range
+            return np.ma.zeros((0, len(valid)))
+        return np.ma.concatenate(values)
+
+    def _extract_points(self, varname, px, py, records=None, thkth=None,
+                        chunk=None):
+        """Extract a variable at many points and time records.
+
+        Vector magnitudes are computed from ``u`` and ``v`` prefixed
+        components if *varname* is not in the file. Ice-free points are
+        masked except for ``topg`` and ``mask``. Ice cover is taken at the
+        nearest cell, as in map plots, so that results are the same with or
+        without an ice-cover cube.
+        """
+        with _read_lock:
+            x = self.variables['x'][:]
+            y = self.variables['y'][:]
+        points = _bilinear_weights(x, y, px, py)
+        if varname not in self.variables and 'u'+varname in self.variables:
+            u = self._interp_points('u'+varname, points, records, chunk)
+            v = self._interp_points('v'+varname, points, records, chunk)
+            z = np.ma.hypot(u, v)
+        else:
+            z = self._interp_points(varname, points, records, chunk)
+
+        # mask ice-free points
+        thkth = thkth or self.thkth
+        cover = self._get_cover(thkth)
+        if varname in ('mask', 'topg'):
+            return z
+        elif cover is not None:
+            window, rows, cols, weights, valid = points
+            nearest = weights.argmax(axis=-1)
+            rows = rows[np.arange(len(rows)), nearest]
+            cols = cols[np.arange(len(cols)), nearest]
+            if records is None:
+                records = range(len(cover))
+            mask = np.array([cover.mask(i, window=window)[rows, cols]
+                             for i in records], dtype=bool)
+            mask = mask.reshape(-1, len(valid)) | ~valid
+        elif thkth is not None and 'thk' in self.variables:
+            mask = self._interp_points('thk', points, records, chunk,
+                                       nearest=True)
+            mask = np.ma.filled(mask < thkth, True)
+        elif 'mask' in self.variables:
+            mask = self._interp_points('mask', points, records, chunk)
+            mask = np.ma.filled((mask == 0) | (mask == 4), True)
+        else:
+            return z
+        return np.ma.masked_where(mask, z)
+
+    def _get_records(self, t0=None, t1=None):
+        """Return times in years and indices of records in a time range."""
+        with _read_lock:
+            time = self.variables['time'][:]/yr2s
+        records = np.flatnonzero((time >= (-np.inf if t0 is None else t0)) &
+                                 (time <= (np.inf if t1 is None else t1)))
+        return time[records], records
+
+    def transect(self, varname, points, t0=None, t1=None, thkth=None,
+                 spacing=None, chunk=None):
+        """Extract a variable along a polyline through time.
+
+        Parameters
+        ----------
+        varname : str
+            Variable name such as ``usurf``, ``thk`` or ``topg``, or a
+            vector name such as ``velsurf`` for its magnitude.
+        points : array_like
+            Polyline vertices as a sequence of (x, y) map coordinates.
+        t0, t1 : float, optional
+            Time range in years, by default all records.
+        spacing : float, optional
+            Distance between samples along the line, by default the grid
+            spacing.
+        chunk : int, optional
+            Maximum number of records read at once.
+
+        Interpolation weights are computed once, and only the grid window
+        bounding the line is read from each record. Returns times in
+        years, distances along the line and a masked array of shape
+        (time, distance), masked where ice-free except for ``topg`` and
+        ``mask``.
+        """
+        with _read_lock:
+            x = self.variables['x'][:]
+            y = self.variables['y'][:]
+        points = np.asarray(points, dtype=float)
+        spacing = spacing or min(abs(x[1]-x[0]), abs(y[1]-y[0]))
+        vertices = np.concatenate(([0.0], np.cumsum(np.hypot(
+            *np.diff(points, axis=0).T))))
+        dist = np.append(np.arange(0.0, vertices[-1], spacing), vertices[-1])
+        px = np.interp(dist, vertices, points[:, 0])
+        py = np.interp(dist, vertices, points[:, 1])
+        time, records = self._get_records(t0, t1)
+        z = self._extract_points(varname, px, py, records=records,
+                                 thkth=thkth, chunk=chunk)
+        if len(z) == 1 and len(time) != 1:  # time-independent variable
+            time = time[:1]
+        return time, dist, z
+
+    def timeseries(self, varname, stations, t0=None, t1=None, thkth=None,
+                   chunk=None):
+        """Extract time series of a variable at many stations at once.
+
+        Parameters
+        ----------
+        varname : str
+            Variable name, or a vector name such as ``velsurf`` for its
+            magnitude.
+        stations : array_like
+            Station locations as a sequence of (x, y) map coordinates.
+        t0, t1 : float, optional
+            Time range in years, by default all records.
+        chunk : int, optional
+            Maximum number of records read at once.
+
+        Interpolation weights are computed for all stations at once, and
+        each chunk of records is read once over the window bounding all
+        stations, across file boundaries for multi-file datasets. Returns
+        times in years and a masked array of shape (stations, time),
+        masked outside the grid and where ice-free except for ``topg`` and
+        ``mask``.
+        """
+        stations = np.asarray(stations, dtype=float).reshape(-1, 2)
+        time, records = self._get_records(t0, t1)
+        z = self._extract_points(varname, stations[:, 0], stations[:, 1],
+                                 records=records, thkth=thkth, chunk=chunk)
+        if len(z) == 1 and len(time) != 1:  # time-independent variable
+            time = time[:1]
+        return time, z.T
+
     # map-plane plotting methods
 
     def contour(self, varname, ax=None, t=None, thkth=None, **kwargs):
@@ -107,24 +753,25 @@ class IceDataset(Dataset):
         ax = _get_map_axes(ax)
         x, y, z = self._extract_xyz(varname, t, thkth=thkth)
         cs = ax.contourf(x[:], y[:], z,
-                         cmap=kwargs.pop('cmap', default_cmaps.get(varname)),
-                         norm=kwargs.pop('norm', default_norms.get(varname)),
+                         cmap=kwargs.pop('cmap',
+                                         icolors.default_cmaps.get(varname)),
+                         norm=kwargs.pop('norm',
+                                         icolors.default_norms.get(varname)),
                          **kwargs)
         return cs
 
     def imshow(self, varname, ax=None, t=None, thkth=None, **kwargs):
         ax = _get_map_axes(ax)
         x, y, z = self._extract_xyz(varname, t, thkth=thkth)
-        w = (3*x[0]-x[1])/2
-        e = (3*x[-1]-x[-2])/2
-        n = (3*y[0]-y[1])/2
-        s = (3*y[-1]-y[-2])/2
+        z, kwargs = _warp_image(ax, x, y, z, kwargs)
         im = ax.imshow(z,
-                       cmap=kwargs.pop('cmap', default_cmaps.get(varname)),
-                       norm=kwargs.pop('norm', default_norms.get(varname)),
+                       cmap=kwargs.pop('cmap',
+                                       icolors.default_cmaps.get(varname)),
+                       norm=kwargs.pop('norm',
+                                       icolors.default_norms.get(varname)),
                        interpolation=kwargs.pop('interpolation', 'nearest'),
                        origin=kwargs.pop('origin', 'lower'),
-                       extent=kwargs.pop('extent', (w, e, n, s)),
+                       extent=kwargs.pop('extent', _get_extent(x, y)),
                        **kwargs)
         return im
 
@@ -132,42 +779,73 @@ class IceDataset(Dataset):
         ax = _get_map_axes(ax)
         x, y, u, v, c = self._extract_xyuvc(varname, t, thkth=thkth)
         scale = kwargs.pop('scale', 100)
-        u = np.sign(u)*np.log(1+np.abs(u)/scale)
-        v = np.sign(v)*np.log(1+np.abs(v)/scale)
+        ftype = np.result_type(u.dtype, np.float32).type
+        u = np.sign(u)*np.log1p(np.abs(u)/ftype(scale))
+        v = np.sign(v)*np.log1p(np.abs(v)/ftype(scale))
         return ax.quiver(x, y, u, v, c, scale=scale,
-                         cmap=kwargs.pop('cmap', default_cmaps.get(
+                         cmap=kwargs.pop('cmap', icolors.default_cmaps.get(
                             'c'+varname.lstrip('vel'))),
-                         norm=kwargs.pop('norm', default_norms.get(
+                         norm=kwargs.pop('norm', icolors.default_norms.get(
                             'c'+varname.lstrip('vel'))),
                          **kwargs)
 
     def streamplot(self, varname, ax=None, t=None, thkth=None, velth=None,
                    **kwargs):
+        """Draw streamlines of a vector field.
+
+        Streamlines are laid out by
+        :func:`iceplotlib.flowlines.streamline_layout`, and their geometry
+        is cached for each frame, density and velocity threshold.
+        Options only supported by matplotlib's own streamplot, or
+        ``engine='matplotlib'``, draw with matplotlib instead.
+        """
         ax = _get_map_axes(ax)
         x, y, u, v, c = self._extract_xyuvc(varname, t, thkth=thkth)
         if velth is not None:
             slow = c < velth
             u = np.ma.masked_where(slow, u)
             v = np.ma.masked_where(slow, v)
-        u[u.mask] = np.nan  # bug in cartopy streamplot?
-        v[v.mask] = np.nan  # bug in cartopy streamplot?
-        return ax.streamplot(x, y, u, v,
-                             density=kwargs.pop('density',
-                                                (1.0, 1.0*len(y)/len(x))),
-                             color=kwargs.pop('color', c),
-                             cmap=kwargs.pop('cmap', default_cmaps.get(
-                                'c'+varname.lstrip('vel'))),
-                             norm=kwargs.pop('norm', default_norms.get(
-                                'c'+varname.lstrip('vel'))),
-                             **kwargs)
+        density = kwargs.pop('density', (1.0, 1.0*len(y)/len(x)))
+        color = kwargs.pop('color', c)
+        cmap = kwargs.pop('cmap', icolors.default_cmaps.get(
+            'c'+varname.lstrip('vel')))
+        norm = kwargs.pop('norm', icolors.default_norms.get(
+            'c'+varname.lstrip('vel')))
+
+        # fall back to matplotlib for unsupported options
+        if (kwargs.pop('engine', None) == 'matplotlib' or
+                np.ndim(kwargs.get('linewidth')) > 0 or
+                any(kw in kwargs for kw in _mpl_streamplot_kw)):
+            u[u.mask] = np.nan  # bug in cartopy streamplot?
+            v[v.mask] = np.nan  # bug in cartopy streamplot?
+            return ax.streamplot(x, y, u, v, density=density, color=color,
+                                 cmap=cmap, norm=norm, **kwargs)
+
+        # get cached streamline geometry
+        minlength = kwargs.pop('minlength', 0.1)
+        maxlength = kwargs.pop('maxlength', 4.0)
+        cache = self.__dict__.setdefault('_streamlines', {})
+        key = (varname, self._get_time_key(t), thkth or self.thkth,
+               tuple(np.broadcast_to(density, 2)), velth, minlength,
+               maxlength)
+        if key not in cache:
+            from iceplotlib.flowlines import streamline_layout
+            if len(cache) >= _streamline_cache_size:
+                del cache[next(iter(cache))]
+            cache[key] = streamline_layout(
+                x, y, u, v, density=density, minlength=minlength,
+                maxlength=maxlength)
+        return _draw_streamlines(ax, x, y, cache[key], color=color,
+                                 cmap=cmap, norm=norm, **kwargs)
 
     def icemargin(self, ax=None, t=None, thkth=None, **kwargs):
         """
         Draw a contour along the ice margin.
         """
         ax = _get_map_axes(ax)
-        x = self.variables['x'][:]
-        y = self.variables['y'][:]
+        with _read_lock:
+            x = self.variables['x'][:]
+            y = self.variables['y'][:]
         mask = self._extract_mask(t, thkth=thkth)
         return ax.contour(x, y, mask, levels=[0.5],
                           colors=kwargs.pop('colors', ['black']),
@@ -178,8 +856,9 @@ class IceDataset(Dataset):
         Fill a contour along the ice margin.
         """
         ax = _get_map_axes(ax)
-        x = self.variables['x'][:]
-        y = self.variables['y'][:]
+        with _read_lock:
+            x = self.variables['x'][:]
+            y = self.variables['y'][:]
         mask = self._extract_mask(t, thkth=thkth)
         return ax.contourf(x, y, mask, levels=[-0.5, 0.5],
                            **kwargs)
@@ -187,37 +866,38 @@ class IceDataset(Dataset):
     def shading(self, varname, ax=None, t=None, thkth=None,
                 azimuth=315, altitude=0, **kwargs):
 
-        # extract data
+        # extract data and compute hillshade
         x, y, z = self._extract_xyz(varname, t, thkth=thkth)
-        w = (3*x[0]-x[1])/2
-        e = (3*x[-1]-x[-2])/2
-        n = (3*y[0]-y[1])/2
-        s = (3*y[-1]-y[-2])/2
-
-        # convert to rad from the x-axis
-        azimuth = (90-azimuth)*np.pi / 180.
-        altitude = altitude*np.pi / 180.
-
-        # compute cartesian coords of the illumination direction
-        x0 = np.cos(azimuth) * np.cos(altitude)
-        y0 = np.sin(azimuth) * np.cos(altitude)
-        z0 = np.sin(altitude)
-        z0 = 0.0  # remove shades from horizontal surfaces
-
-        # compute hillshade (dot product of normal and light direction vectors)
-        dx = x[1] - x[0]
-        dy = y[1] - y[0]
-        u, v = np.gradient(z, dx, dy)
-        shade = (z0 - u*x0 - v*y0) / (1 + u**2 + v**2)**(0.5)
+        shade = _hillshade(x, y, z, azimuth=azimuth, altitude=altitude)
 
         # plot shadows only (white transparency is not possible)
         ax = _get_map_axes(ax)
-        return ax.imshow((shade > 0)*shade,
-                         cmap=kwargs.pop('cmap', default_cmaps.get('shading')),
-                         norm=kwargs.pop('norm', default_norms.get('shading')),
-                         extent=kwargs.pop('extent', (w, e, n, s)),
+        shade, kwargs = _warp_image(ax, x, y, shade, kwargs)
+        return ax.imshow(shade,
+                         cmap=kwargs.pop('cmap',
+                                         icolors.default_cmaps.get('shading')),
+                         norm=kwargs.pop('norm',
+                                         icolors.default_norms.get('shading')),
+                         extent=kwargs.pop('extent', _get_extent(x, y)),
                          **kwargs)
 
+    # time-distance plotting methods
+
+    def hovmoller(self, varname, points, ax=None, t0=None, t1=None,
+                  thkth=None, **kwargs):
+        """Draw a variable along a polyline against time."""
+        import matplotlib.pyplot as plt
+        ax = ax or plt.gca()
+        t, d, z = self.transect(varname, points, t0=t0, t1=t1, thkth=thkth,
+                                spacing=kwargs.pop('spacing', None))
+        return ax.pcolormesh(d, t, z,
+                             shading=kwargs.pop('shading', 'auto'),
+                             cmap=kwargs.pop('cmap', icolors.default_cmaps.get(
+                                varname)),
+                             norm=kwargs.pop('norm', icolors.default_norms.get(
+                                varname)),
+                             **kwargs)
+
     # new, composite mapping methods
 
     def icemap(self, ax=None, t=None, thkth=None, **kwargs):
@@ -248,6 +928,13 @@ class IceDataset(Dataset):
 class MFIceDataset(IceDataset, MFDataset):
     """Multi-file NetCDF Dataset with plotting methods."""
 
-    def __init__(self, files, thkth=1.0, **kwargs):
-        MFDataset.__init__(self, files, **kwargs)
-        self.__dict__['thkth'] = thkth
+    def __init__(self, files, thkth=1.0, store=None, storevars=None,
+                 dtype=None, interp=False, icecover=None, **kwargs):
+        with _read_lock:
+            MFDataset.__init__(self, files, **kwargs)
+            self.__dict__['thkth'] = thkth
+            self.__dict__['dtype'] = dtype
+            self.__dict__['interp'] = interp
+            self.__dict__['_records'] = {}
+            self._open_store(store, files, storevars)
+            self._open_icecover(icecover, files)
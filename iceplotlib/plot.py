@@ -1,13 +1,13 @@
 """:mod:`iceplotlib.plot`
 
 Provide the actual plotting interface.
+
+Pyplot functions, dataset classes and plotting methods are imported on first
+access, so that importing this module does not load pyplot nor netCDF4.
 """
 
 import glob
-import matplotlib.pyplot as plt
 import matplotlib.figure as mfig
-from matplotlib.pyplot import *
-from iceplotlib.io import IceDataset, MFIceDataset
 
 
 # Custom figure class
@@ -64,11 +64,78 @@ class IceFigure(mfig.Figure):
         # create subplots
         return self.subplots_inches(gridspec_kw=gridspec_kw, **kw)
 
+    def draw_panels(self, panels, axes=None, threads=None):
+        """Draw maps on several axes reading shared fields only once.
+
+        Parameters
+        ----------
+        panels : dict
+            Mapping of panels to (dataset, time, recipe) tuples. Panels are
+            axes, or keys into *axes* such as (row, col) indices. Recipes
+            are the name of an IceDataset plotting method, or a tuple of
+            that name followed by positional arguments and optionally a
+            dictionary of keyword arguments, e.g. ``('imshow', 'thk')``.
+        axes : array or dict, optional
+            Axes indexed by panel keys, as returned by :meth:`subplots_mm`.
+        threads : int, optional
+            Number of threads used to extract fields before drawing. By
+            default fields are extracted serially.
+
+        All reads are planned before drawing, so that fields and masks
+        shared between panels, e.g. a static bed topography, are read and
+        computed only once. Returns a dictionary of the values returned by
+        each plotting method.
+        """
+        from contextlib import ExitStack
+        from concurrent.futures import ThreadPoolExecutor
+
+        # parse recipes
+        calls = {}
+        for key, (nc, t, recipe) in panels.items():
+            if isinstance(recipe, str):
+                recipe = (recipe,)
+            name, args = recipe[0], list(recipe[1:])
+            kwargs = args.pop() if args and isinstance(args[-1], dict) else {}
+            ax = key if axes is None else axes[key]
+            calls[key] = nc, t, name, args, kwargs, ax
+
+        # plan unique reads
+        reads = {}
+        for nc, t, name, args, kwargs, ax in calls.values():
+            for kind, arg in nc._get_requirements(name, *args, **kwargs):
+                if kind == 'field':
+                    tkey = nc._get_time_key(t, nc._get_variable(arg))
+                    reads[id(nc), kind, arg, tkey] = (
+                        nc._extract_2d, (arg, t), {})
+                else:
+                    tkey = nc._get_time_key(t or 0)
+                    reads[id(nc), kind, arg, tkey] = (
+                        nc._extract_mask, (t,), dict(thkth=arg))
+
+        # extract fields then draw using cached data
+        datasets = {id(call[0]): call[0] for call in calls.values()}
+        with ExitStack() as stack:
+            for nc in datasets.values():
+                stack.enter_context(nc.cached())
+            jobs = [(func, args, kwargs) for func, args, kwargs
+                    in reads.values()]
+            if threads is None or threads <= 1:
+                for func, args, kwargs in jobs:
+                    func(*args, **kwargs)
+            else:
+                with ThreadPoolExecutor(threads) as executor:
+                    list(executor.map(lambda job: job[0](*job[1], **job[2]),
+                                      jobs))
+            return {key: getattr(nc, name)(*args, ax=ax, t=t, **kwargs)
+                    for key, (nc, t, name, args, kwargs, ax)
+                    in calls.items()}
+
 
 # File open function
 # ------------------
 
 def load(filename, **kwargs):
+    from iceplotlib.io import IceDataset, MFIceDataset
 
     # look for matching files
     # this allows even single files to be matched
@@ -92,6 +159,7 @@ def load(filename, **kwargs):
 
 def figure(**kw):
     """Create a new figure with dimensions in inches."""
+    import matplotlib.pyplot as plt
 
     # by default select custom figure class
     FigureClass = kw.pop('FigureClass', IceFigure)
@@ -176,15 +244,52 @@ def subplots_mm(nrows=1, ncols=1, sharex=False, sharey=False, squeeze=True,
 # Plotting functions
 # ------------------
 
-# import all plotting methods locally defined in IceDataset as functions
+# import plotting methods locally defined in IceDataset as functions
 
 def _import_icedataset_method(name):
+    from iceplotlib.io import IceDataset
     def func(nc, *args, **kwargs):
         return getattr(nc, name)(*args, **kwargs)
     func.__doc__ = getattr(IceDataset, name).__doc__
     globals()[name] = func
+    return func
+
 
+# Lazy imports
+# ------------
 
-for name, attr in IceDataset.__dict__.iteritems():
-    if callable(attr) and not name.startswith("__"):
-        _import_icedataset_method(name)
+def __getattr__(name):
+    """Import dataset classes, plotting methods and pyplot on first access."""
+    if name.startswith('__'):
+        raise AttributeError('module %s has no attribute %s' % (
+            __name__, name))
+
+    # dataset classes and plotting methods
+    import iceplotlib.io
+    if name in ('IceDataset', 'MFIceDataset'):
+        value = getattr(iceplotlib.io, name)
+    elif callable(iceplotlib.io.IceDataset.__dict__.get(name)):
+        return _import_icedataset_method(name)
+
+    # public pyplot functions
+    else:
+        import matplotlib.pyplot as plt
+        if name.startswith('_') or not hasattr(plt, name):
+            raise AttributeError('module %s has no attribute %s' % (
+                __name__, name))
+        value = getattr(plt, name)
+
+    # cache for later access
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List module attributes including those imported on first access."""
+    import matplotlib.pyplot as plt
+    from iceplotlib.io import IceDataset
+    methods = [k for k, v in IceDataset.__dict__.items()
+               if callable(v) and not k.startswith('_')]
+    pyplot = [k for k in dir(plt) if not k.startswith('_')]
+    return sorted(set(globals()) | set(methods) | set(pyplot) |
+                  set(['IceDataset', 'MFIceDataset']))
@@ -0,0 +1,329 @@
+""":mod:`iceplotlib.render`
+
+Render fields directly to RGBA arrays.
+
+This provides a faster alternative to the ``imshow`` path for headless
+rendering and animations. Fields are quantised through a colormap lookup
+table precomputed once per colormap, and map layers are composited
+in NumPy, so that only the final RGBA image is handed to matplotlib.
+
+Frames can also be exported without matplotlib figures at all, as PNG
+images with one pixel per grid cell or as a raw RGBA stream.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import iceplotlib.colors as icolors
+from iceplotlib.io import (_get_extent, _get_map_axes, _hillshade,
+                           _read_lock, _warp_image, yr2s)
+
+# lookup tables cached by colormap instance
+_luts = {}
+
+# colormaps resolved from their names
+_named_cmaps = {}
+
+
+# Lookup tables
+# -------------
+
+def _get_cmap(cmap=None):
+    """Return a colormap instance from a name, an instance or None."""
+    if cmap is None or isinstance(cmap, str):
+        if cmap not in _named_cmaps:
+            import matplotlib.pyplot as plt
+            _named_cmaps[cmap] = plt.get_cmap(cmap)
+        cmap = _named_cmaps[cmap]
+    return cmap
+
+
+def _get_limits(z, norm=None, log=False):
+    """Return norm limits, autoscaling on valid data like matplotlib."""
+    vmin = getattr(norm, 'vmin', None)
+    vmax = getattr(norm, 'vmax', None)
+    if vmin is None or vmax is None:
+        z = np.ma.masked_invalid(z)
+        if log:
+            z = np.ma.masked_less_equal(z, 0)
+        if z.count() == 0:
+            return 1.0, 1.0
+        vmin = z.min() if vmin is None else vmin
+        vmax = z.max() if vmax is None else vmax
+    return float(vmin), float(vmax)
+
+
+def colormap_lut(cmap=None):
+    """Return an RGBA lookup table of uint8 for a colormap.
+
+    The table has ``cmap.N + 3`` rows corresponding to the under color, the
+    colormap colors, the over color and the bad color. Tables are cached
+    for each colormap instance.
+    """
+    cmap = _get_cmap(cmap)
+    key = id(cmap), cmap.N
+    if key not in _luts or _luts[key][0] is not cmap:
+        lut = np.empty((cmap.N+3, 4), dtype=np.uint8)
+        lut[:-1] = cmap(np.arange(-1, cmap.N+1), bytes=True)
+        lut[-1] = cmap(np.ma.masked_invalid([np.nan]), bytes=True)[0]
+        _luts[key] = cmap, lut
+    return _luts[key][1]
+
+
+def to_rgba(z, cmap=None, norm=None):
+    """Map a two-dimensional array to an uint8 RGBA image.
+
+    Linear and logarithmic norms are applied as a vectorised affine
+    transform into the lookup table. Other norms are called directly.
+    Masked and invalid values use the bad color.
+    """
+    from matplotlib.colors import LogNorm, Normalize
+
+    # get lookup table and bad values
+    cmap = _get_cmap(cmap)
+    lut = colormap_lut(cmap)
+    n = cmap.N
+    bad = np.ma.getmaskarray(z) | ~np.isfinite(np.ma.getdata(z))
+    z = np.ma.getdata(z)
+
+    # normalize to the [0, n] interval
+    if norm is None or type(norm) in (Normalize, LogNorm):
+        log = type(norm) is LogNorm
+        vmin, vmax = _get_limits(np.ma.masked_where(bad, z), norm, log=log)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if log:
+                bad |= z <= 0
+                z = np.log(z)
+                vmin, vmax = np.log(vmin), np.log(vmax)
+            z = (z-vmin) * (n/(vmax-vmin) if vmax > vmin else 0.0)
+    else:
+        z = np.ma.getdata(norm(np.ma.masked_where(bad, z)))*n
+
+    # quantise to indices in the lookup table
+    with np.errstate(invalid='ignore'):
+        idx = np.floor(np.where(bad, 0, z))
+    idx[idx == n] = n-1
+    np.clip(idx, -1, n, out=idx)
+    idx = idx.astype(np.intp) + 1
+    idx[bad] = n+2
+    return lut[idx]
+
+
+def composite(*layers):
+    """Alpha-composite uint8 RGBA layers from bottom to top."""
+    out = layers[0][..., :3].astype(np.float32)
+    for layer in layers[1:]:
+        alpha = layer[..., 3:].astype(np.float32) / 255
+        out *= 1 - alpha
+        out += layer[..., :3] * alpha
+    rgba = np.empty(layers[0].shape, dtype=np.uint8)
+    rgba[..., :3] = np.rint(out)
+    rgba[..., 3] = np.max([layer[..., 3] for layer in layers], axis=0)
+    return rgba
+
+
+# Dataset rendering
+# -----------------
+
+def field_rgba(nc, varname, t=None, thkth=None, cmap=None, norm=None,
+               window=None):
+    """Render a dataset variable to an uint8 RGBA image.
+
+    If *window* is given as a pair of (y, x) slices, only that part of the
+    grid is read and rendered.
+    """
+    x, y, z = nc._extract_xyz(varname, t, thkth=thkth, window=window)
+    return to_rgba(z,
+                   cmap=cmap or icolors.default_cmaps.get(varname),
+                   norm=norm or icolors.default_norms.get(varname))
+
+
+def shading_rgba(nc, varname, t=None, thkth=None, azimuth=315, altitude=0,
+                 cmap=None, norm=None, window=None):
+    """Render hillshade of a dataset variable to an uint8 RGBA image."""
+    x, y, z = nc._extract_xyz(varname, t, thkth=thkth, window=window)
+    shade = _hillshade(x, y, z, azimuth=azimuth, altitude=altitude)
+    return to_rgba(shade,
+                   cmap=cmap or icolors.default_cmaps.get('shading'),
+                   norm=norm or icolors.default_norms.get('shading'))
+
+
+def icemap_rgba(nc, t=None, thkth=None, shading='topg', window=None,
+                **kwargs):
+    """Composite basal topography, surface velocity and shading layers.
+
+    Colormaps and norms can be customized using the same ``topg_`` and
+    ``velsurf_`` prefixed keywords as :meth:`IceDataset.icemap`. Contours
+    are not drawn, and the shading layer can be disabled with
+    ``shading=None``.
+    """
+    layers = [field_rgba(nc, 'topg', t=t, thkth=thkth,
+                         cmap=kwargs.get('topg_cmap'),
+                         norm=kwargs.get('topg_norm'), window=window)]
+    if shading is not None:
+        layers.append(shading_rgba(nc, shading, t=t, thkth=thkth,
+                                   window=window))
+    layers.append(field_rgba(nc, 'velsurf_mag', t=t, thkth=thkth,
+                             cmap=kwargs.get('velsurf_cmap'),
+                             norm=kwargs.get('velsurf_norm'), window=window))
+    return composite(*layers)
+
+
+def show_rgba(nc, rgba, ax=None, **kwargs):
+    """Draw an RGBA image over the dataset extent."""
+    ax = _get_map_axes(ax)
+    with _read_lock:
+        x = nc.variables['x'][:]
+        y = nc.variables['y'][:]
+    rgba, kwargs = _warp_image(ax, x, y, rgba, kwargs)
+    return ax.imshow(rgba,
+                     interpolation=kwargs.pop('interpolation', 'nearest'),
+                     origin=kwargs.pop('origin', 'lower'),
+                     extent=kwargs.pop('extent', _get_extent(x, y)),
+                     **kwargs)
+
+
+def imsave(filename, rgba, **kwargs):
+    """Save an RGBA image with the lower origin used in map images."""
+    import matplotlib.image as mimg
+    mimg.imsave(filename, rgba, origin='lower', **kwargs)
+
+
+# Direct export
+# -------------
+
+def _png_chunk(tag, data):
+    """Return a PNG chunk with its length and checksum."""
+    return (struct.pack('>I', len(data)) + tag + data +
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+
+def png_bytes(rgba, compression=6):
+    """Encode an RGBA image with lower origin to PNG bytes.
+
+    The image is written without any resampling, and compressed with
+    :mod:`zlib`, which releases the interpreter lock so that several
+    images can be encoded in parallel threads.
+    """
+    rgba = np.ascontiguousarray(rgba[::-1], dtype=np.uint8)
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width*4+1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width*4)  # filter type 0
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b''.join([b'\x89PNG\r\n\x1a\n',
+                     _png_chunk(b'IHDR', header),
+                     _png_chunk(b'IDAT', zlib.compress(raw.tobytes(),
+                                                       compression)),
+                     _png_chunk(b'IEND', b'')])
+
+
+def write_png(filename, rgba, compression=6):
+    """Write an RGBA image with lower origin to a PNG file."""
+    with open(filename, 'wb') as f:
+        f.write(png_bytes(rgba, compression=compression))
+
+
+def write_worldfile(filename, x, y):
+    """Write a world file georeferencing an image of the grid.
+
+    The world file maps pixel centres of a north-up image with one pixel
+    per grid cell to map coordinates.
+    """
+    dx = abs(float(x[1]-x[0]))
+    dy = abs(float(y[1]-y[0]))
+    with open(filename, 'w') as f:
+        f.write('%r\n0.0\n0.0\n%r\n%r\n%r\n' % (
+            dx, -dy, float(min(x[0], x[-1])), float(max(y[0], y[-1]))))
+
+
+def _iter_frames(nc, varname, frames=None, thkth=None, cmap=None,
+                 norm=None):
+    """Iterate over RGBA frames with a norm fixed across frames."""
+    from matplotlib.colors import Normalize
+    if frames is None:
+        with _read_lock:
+            frames = nc.variables['time'][:]/yr2s
+    cmap = cmap or icolors.default_cmaps.get(varname)
+    norm = norm or icolors.default_norms.get(varname)
+    for t in frames:
+        z = nc._extract_xyz(varname, t, thkth=thkth)[2]
+        if norm is None:
+            norm = Normalize(*_get_limits(z))
+        yield to_rgba(z, cmap=cmap, norm=norm)
+
+
+def export_png(nc, varname, pattern, frames=None, thkth=None, cmap=None,
+               norm=None, threads=None, compression=6, worldfile=False):
+    """Export frames as PNG images with one pixel per grid cell.
+
+    Parameters
+    ----------
+    nc : IceDataset
+        Dataset to read frames from.
+    varname : str
+        Name of the variable to render.
+    pattern : str
+        Output file name pattern formatted with the frame number, e.g.
+        ``'frames/%05d.png'``.
+    frames : sequence, optional
+        Times in years or time keywords, by default all time records.
+    cmap, norm : optional
+        Colormap and norm, defaulting to iceplotlib's default styling. If
+        no norm is given, limits are set from the first frame.
+    threads : int, optional
+        Number of threads encoding images while the next frames are read.
+        Images are encoded in the current thread if None.
+    worldfile : bool, optional
+        Whether to write a ``.pgw`` world file next to each image.
+
+    Returns the list of written file names.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    with _read_lock:
+        x = nc.variables['x'][:]
+        y = nc.variables['y'][:]
+    filenames = []
+    pool = threads and ThreadPoolExecutor(threads)
+    pending = []
+    try:
+        for i, rgba in enumerate(_iter_frames(nc, varname, frames=frames,
+                                              thkth=thkth, cmap=cmap,
+                                              norm=norm)):
+            filename = pattern % i
+            if worldfile:
+                write_worldfile(filename[:-4]+'.pgw', x, y)
+            if pool:
+                pending.append(pool.submit(write_png, filename, rgba,
+                                           compression))
+                while len(pending) > 2*threads:
+                    pending.pop(0).result()
+            else:
+                write_png(filename, rgba, compression=compression)
+            filenames.append(filename)
+        for future in pending:
+            future.result()
+    finally:
+        if pool:
+            pool.shutdown()
+    return filenames
+
+
+def export_raw(nc, varname, filename, frames=None, thkth=None, cmap=None,
+               norm=None):
+    """Export frames as a raw stream of uint8 RGBA pixels.
+
+    Frames are written consecutively with north on top, as expected e.g.
+    by ``ffmpeg -f rawvideo -pix_fmt rgba``. Returns the stream shape as
+    (frames, height, width, 4).
+    """
+    count = 0
+    with _read_lock:
+        shape = len(nc.dimensions['y']), len(nc.dimensions['x']), 4
+    with open(filename, 'wb') as f:
+        for rgba in _iter_frames(nc, varname, frames=frames, thkth=thkth,
+                                 cmap=cmap, norm=norm):
+            f.write(np.ascontiguousarray(rgba[::-1]).tobytes())
+            count += 1
+            shape = rgba.shape
+    return (count,) + shape
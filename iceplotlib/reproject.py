@@ -0,0 +1,180 @@
+""":mod:`iceplotlib.reproject`
+
+Reproject map images onto cartopy axes using cached warp plans.
+
+Cartopy regrids images drawn with a ``transform`` differing from the axes
+projection by transforming the coordinates of every target pixel again on
+each call. A warp plan instead stores, for each target pixel, the index of
+the nearest source grid cell. It is computed once per source grid, source
+and target projections and output extent and shape, and then applied to
+each field and frame by array indexing::
+
+    ax = iplt.subplots_mm(projection=ccrs.Orthographic(-120, 60))[1]
+    nc.imshow('thk', ax=ax, transform=ccrs.UTM(10))
+
+Plans are cached in memory, and on disk as ``.npz`` files if a
+``cachedir`` keyword is passed to the plotting methods.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+# warp plans cached by key
+_plans = {}
+
+
+def _crs_key(crs):
+    """Return a string identifying a cartopy coordinate reference system."""
+    return getattr(crs, 'proj4_init', None) or repr(crs)
+
+
+def _regrid_shape(regrid_shape, extent):
+    """Return target image shape as (rows, columns).
+
+    A single integer gives the length of the shorter side, as in cartopy.
+    """
+    if not np.iterable(regrid_shape):
+        width = extent[1] - extent[0]
+        height = extent[3] - extent[2]
+        if width < height:
+            regrid_shape = regrid_shape, regrid_shape*height/width
+        else:
+            regrid_shape = regrid_shape*width/height, regrid_shape
+    nx, ny = regrid_shape
+    return int(round(ny)), int(round(nx))
+
+
+def _edges(x, y):
+    """Return outer cell edges of a regular grid as (w, e, s, n)."""
+    dx = x[1] - x[0]
+    dy = y[1] - y[0]
+    return x[0]-dx/2, x[-1]+dx/2, y[0]-dy/2, y[-1]+dy/2
+
+
+def _target_extent(x, y, src_crs, tgt_crs):
+    """Return the bounding box of the source grid in the target projection."""
+    w, e, s, n = _edges(x, y)
+    xb = np.linspace(w, e, len(x)+1)
+    yb = np.linspace(s, n, len(y)+1)
+    bx = np.concatenate([xb, np.full_like(yb, e),
+                         xb[::-1], np.full_like(yb, w)])
+    by = np.concatenate([np.full_like(xb, s), yb,
+                         np.full_like(xb, n), yb[::-1]])
+    pts = tgt_crs.transform_points(src_crs, bx, by)
+    tx, ty = pts[:, 0], pts[:, 1]
+    finite = np.isfinite(tx) & np.isfinite(ty)
+    return (tx[finite].min(), tx[finite].max(),
+            ty[finite].min(), ty[finite].max())
+
+
+class WarpPlan(object):
+    """Nearest-neighbour index map from a source grid to target pixels.
+
+    Target images have their origin at the lower left corner and cover
+    *extent* given as (xmin, xmax, ymin, ymax) in the target projection.
+    """
+
+    def __init__(self, rows, cols, valid, extent):
+        self.rows = rows
+        self.cols = cols
+        self.valid = valid
+        self.extent = tuple(float(e) for e in extent)
+
+    @property
+    def shape(self):
+        return self.valid.shape
+
+    @classmethod
+    def compute(cls, x, y, src_crs, tgt_crs, regrid_shape=750,
+                target_extent=None):
+        """Compute a warp plan by transforming target pixel centres."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        extent = target_extent or _target_extent(x, y, src_crs, tgt_crs)
+        ny, nx = _regrid_shape(regrid_shape, extent)
+
+        # transform target pixel centres to source coordinates
+        tx = extent[0] + (np.arange(nx)+0.5) * (extent[1]-extent[0]) / nx
+        ty = extent[2] + (np.arange(ny)+0.5) * (extent[3]-extent[2]) / ny
+        tx, ty = np.meshgrid(tx, ty)
+        pts = src_crs.transform_points(tgt_crs, tx, ty)
+
+        # locate nearest source cells on the regular grid
+        with np.errstate(invalid='ignore'):
+            cols = np.rint((pts[..., 0]-x[0]) / (x[1]-x[0]))
+            rows = np.rint((pts[..., 1]-y[0]) / (y[1]-y[0]))
+            valid = ((cols >= 0) & (cols < len(x)) &
+                     (rows >= 0) & (rows < len(y)))
+        rows = np.where(valid, rows, 0).astype(np.int32)
+        cols = np.where(valid, cols, 0).astype(np.int32)
+        return cls(rows, cols, valid, extent)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a warp plan saved with :meth:`save`."""
+        with np.load(filename) as f:
+            return cls(f['rows'], f['cols'], f['valid'], f['extent'])
+
+    def save(self, filename):
+        """Save warp plan to an ``.npz`` file."""
+        np.savez(filename, rows=self.rows, cols=self.cols, valid=self.valid,
+                 extent=self.extent)
+
+    def apply(self, z):
+        """Warp a two-dimensional field or an RGBA image.
+
+        Fields are returned as masked arrays masked outside the source
+        grid. RGBA images are made transparent there.
+        """
+        if np.ndim(z) == 3:
+            out = np.asarray(z)[self.rows, self.cols]
+            out[~self.valid] = 0
+            return out
+        out = np.ma.asarray(z)[self.rows, self.cols]
+        return np.ma.masked_where(~self.valid, out, copy=False)
+
+
+def get_plan(x, y, src_crs, tgt_crs, regrid_shape=750, target_extent=None,
+             cachedir=None):
+    """Return a cached warp plan, computing it on first use.
+
+    Parameters
+    ----------
+    x, y : array_like
+        Cell-centered coordinates of the regular source grid.
+    src_crs, tgt_crs : cartopy.crs.CRS
+        Source and target coordinate reference systems.
+    regrid_shape : int or (int, int), optional
+        Target image shape as (columns, rows), or length of its shorter
+        side, as in cartopy.
+    target_extent : tuple, optional
+        Target image extent, by default the bounding box of the source grid
+        in the target projection.
+    cachedir : str, optional
+        Directory where plans are saved and looked up on disk.
+    """
+    sha = hashlib.sha1()
+    sha.update(np.asarray(x, dtype=np.float64).tobytes())
+    sha.update(np.asarray(y, dtype=np.float64).tobytes())
+    sha.update(repr((_crs_key(src_crs), _crs_key(tgt_crs), regrid_shape,
+                     target_extent)).encode())
+    key = sha.hexdigest()
+    if key in _plans:
+        return _plans[key]
+
+    # look up plan on disk or compute it
+    filename = cachedir and os.path.join(cachedir, 'warp-%s.npz' % key)
+    if filename and os.path.isfile(filename):
+        plan = WarpPlan.load(filename)
+    else:
+        plan = WarpPlan.compute(x, y, src_crs, tgt_crs,
+                                regrid_shape=regrid_shape,
+                                target_extent=target_extent)
+        if filename:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            plan.save(filename)
+    _plans[key] = plan
+    return plan
@@ -0,0 +1,276 @@
+""":mod:`iceplotlib.server`
+
+Serve rendered maps as PNG images over HTTP.
+
+A long-lived render server keeps datasets open, and their colormap lookup
+tables and parsed time axes warm, so that dashboards embedding iceplotlib
+maps do not pay for importing matplotlib and opening files on every
+request. Start it from the command line::
+
+    python -m iceplotlib.server --port 8050 --root /data/pism
+
+and request images with a URL such as::
+
+    http://localhost:8050/render?file=run.nc&var=thk&t=-20000
+        &bbox=-500e3,-400e3,500e3,400e3&size=400,320
+
+Recognized parameters are ``file`` (relative to the server root), ``var``
+(a variable name, ``shading`` or ``icemap``), ``t`` (time in years or a
+time keyword), ``thkth``, ``bbox`` as ``xmin,ymin,xmax,ymax`` in map
+coordinates and ``size`` as ``width,height`` in pixels. Renders run in a
+bounded pool of threads, and identical requests arriving while one is
+being rendered share its result.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlencode, urlparse
+from urllib.request import urlopen
+
+import numpy as np
+
+
+# Rendering
+# ---------
+
+def _pixel_index(coords, lo, hi, size):
+    """Return indices of grid cells nearest to pixel centres, or -1."""
+    pixels = lo + (np.arange(size)+0.5) * (hi-lo) / size
+    index = np.rint((pixels-coords[0]) / (coords[1]-coords[0]))
+    index[(index < 0) | (index >= len(coords))] = -1
+    return index.astype(np.intp)
+
+
+def render_png(nc, varname, t=None, thkth=None, bbox=None, size=None):
+    """Render a dataset variable within a bounding box to PNG bytes.
+
+    Only the grid window covering *bbox* is read. The image is resampled
+    to *size* as (width, height) by nearest neighbours, and is transparent
+    outside the grid. Defaults are the full grid at its native resolution.
+    Raises ValueError for malformed boxes and sizes.
+    """
+    from iceplotlib.io import _read_lock
+    from iceplotlib.render import (field_rgba, icemap_rgba, shading_rgba,
+                                   png_bytes)
+    with _read_lock:
+        x = nc.variables['x'][:]
+        y = nc.variables['y'][:]
+    dx, dy = abs(x[1]-x[0]), abs(y[1]-y[0])
+    if bbox is None:
+        bbox = x.min()-dx/2, y.min()-dy/2, x.max()+dx/2, y.max()+dy/2
+    if len(bbox) != 4 or not (bbox[0] < bbox[2] and bbox[1] < bbox[3]):
+        raise ValueError('bbox must be given as xmin,ymin,xmax,ymax')
+    if size is None:
+        size = (int(round((bbox[2]-bbox[0])/dx)),
+                int(round((bbox[3]-bbox[1])/dy)))
+    if len(size) != 2 or min(size) <= 0:
+        raise ValueError('size must be given as two positive integers')
+    cols = _pixel_index(x, bbox[0], bbox[2], size[0])
+    rows = _pixel_index(y, bbox[1], bbox[3], size[1])
+    inside = (rows[:, None] >= 0) & (cols[None, :] >= 0)
+
+    # read the window covering the box, at least two cells wide
+    if inside.any():
+        ci, ri = cols[cols >= 0], rows[rows >= 0]
+        c0 = min(ci.min(), len(x)-2)
+        r0 = min(ri.min(), len(y)-2)
+        window = (slice(r0, max(ri.max()+1, r0+2)),
+                  slice(c0, max(ci.max()+1, c0+2)))
+        if varname == 'icemap':
+            rgba = icemap_rgba(nc, t=t, thkth=thkth, window=window)
+        elif varname == 'shading':
+            rgba = shading_rgba(nc, 'usurf', t=t, thkth=thkth, window=window)
+        else:
+            rgba = field_rgba(nc, varname, t=t, thkth=thkth, window=window)
+        image = rgba[(rows-r0).clip(0)[:, None], (cols-c0).clip(0)[None, :]]
+        image[~inside] = 0
+    else:
+        image = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+    return png_bytes(image)
+
+
+# Render server
+# -------------
+
+class RenderServer(ThreadingMixIn, HTTPServer):
+    """HTTP server rendering maps from datasets kept open.
+
+    Datasets are opened with :func:`iceplotlib.plot.load` on first request
+    with keyword arguments *loadkw*, and reopened if their file changed.
+    Frame store and ice-cover directories given as *store* and *icecover*
+    are roots under which each file gets its own subdirectory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('localhost', 8050), root='.', workers=4,
+                 **loadkw):
+        HTTPServer.__init__(self, address, RenderHandler)
+        self.root = os.path.abspath(root)
+        self.loadkw = loadkw
+        self.pool = ThreadPoolExecutor(workers)
+        self.datasets = {}
+        self.refcounts = {}
+        self.pending = {}
+        self.lock = threading.RLock()
+
+    def _get_loadkw(self, path):
+        """Return load keyword arguments with per-file cache directories."""
+        loadkw = dict(self.loadkw)
+        key = hashlib.sha1(path.encode()).hexdigest()[:16]
+        for name in ('store', 'icecover'):
+            if loadkw.get(name) is not None:
+                loadkw[name] = os.path.join(loadkw[name], key)
+        return loadkw
+
+    @contextlib.contextmanager
+    def get_dataset(self, filename):
+        """Borrow an open dataset, reopening it if the file changed.
+
+        Datasets replaced while in use are closed after their last render.
+        """
+        from iceplotlib.io import _read_lock
+        from iceplotlib.plot import load
+        path = os.path.abspath(os.path.join(self.root, filename))
+        if os.path.commonprefix([path, self.root+os.sep]) != self.root+os.sep:
+            raise ValueError('file %s outside server root' % filename)
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            nc, opened = self.datasets.get(path, (None, None))
+            if nc is None or opened != mtime:
+                with _read_lock:  # opening and building stores read files
+                    new = load(path, **self._get_loadkw(path))
+                if nc is not None:
+                    self._release(nc)
+                nc = new
+                self.datasets[path] = nc, mtime
+                self.refcounts[id(nc)] = 1
+            self.refcounts[id(nc)] += 1
+        try:
+            yield nc
+        finally:
+            self._release(nc)
+
+    def _release(self, nc):
+        """Drop a reference to a dataset, closing it after its last use."""
+        from iceplotlib.io import _read_lock
+        with self.lock:
+            self.refcounts[id(nc)] -= 1
+            if self.refcounts[id(nc)] == 0:
+                del self.refcounts[id(nc)]
+                with _read_lock:
+                    nc.close()
+
+    def render(self, params):
+        """Render a request, sharing results of identical pending ones."""
+        key = tuple(sorted(params.items()))
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pool.submit(self._render, params)
+                self.pending[key] = future
+                future.add_done_callback(
+                    lambda f: self._discard(key, f))
+        return future.result()
+
+    def _discard(self, key, future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def _render(self, params):
+        from iceplotlib.io import _seasons
+        t = params.get('t')
+        try:
+            t = float(t)
+        except (TypeError, ValueError):
+            if t is not None and t != 'mean' and t not in _seasons:
+                raise ValueError('unknown time %s' % t)
+        thkth = params.get('thkth')
+        bbox = params.get('bbox')
+        size = params.get('size')
+        with self.get_dataset(params['file']) as nc:
+            return render_png(
+                nc, params['var'], t=t,
+                thkth=float(thkth) if thkth else None,
+                bbox=[float(v) for v in bbox.split(',')] if bbox else None,
+                size=[int(v) for v in size.split(',')] if size else None)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.pool.shutdown()
+        with self.lock:
+            for nc, mtime in self.datasets.values():
+                self._release(nc)
+            self.datasets.clear()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """Handle render requests to a :class:`RenderServer`."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        if url.path != '/render' or 'file' not in params or \
+                'var' not in params:
+            return self.send_error(404, 'expected /render?file=...&var=...')
+        try:
+            data = self.server.render(params)
+        except (IOError, OSError, KeyError, ValueError) as e:
+            return self.send_error(400, str(e))
+        except Exception as e:
+            return self.send_error(500, str(e))
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fetch(url='http://localhost:8050', **params):
+    """Request a render from a server and return PNG bytes."""
+    for key in ('bbox', 'size'):
+        if key in params and not isinstance(params[key], str):
+            params[key] = ','.join(str(v) for v in params[key])
+    response = urlopen('%s/render?%s' % (url.rstrip('/'), urlencode(params)))
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def serve(host='localhost', port=8050, root='.', workers=4, **loadkw):
+    """Run a render server until interrupted."""
+    server = RenderServer((host, port), root=root, workers=workers, **loadkw)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[2])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--root', default='.',
+                        help='directory files are looked up in')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='maximum number of concurrent renders')
+    parser.add_argument('--store',
+                        help='directory holding a frame store per file')
+    args = parser.parse_args()
+    import matplotlib
+    matplotlib.use('Agg')
+    serve(args.host, args.port, args.root, args.workers, store=args.store)
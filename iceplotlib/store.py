@@ -0,0 +1,142 @@
+""":mod:`iceplotlib.store`
+
+Cache PISM variables in a memory-mapped frame store.
+
+Reading compressed NetCDF files decompresses the same frames again on every
+run. A frame store is a directory holding an uncompressed float32 ``.npy``
+file per variable, laid out as (time, y, x) so that each frame is one
+contiguous block. Datasets opened with a ``store`` argument read from it
+through zero-copy :class:`numpy.memmap` views.
+
+The store is rebuilt automatically when its source files change.
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+from iceplotlib.io import _is_continuous
+
+# version of the store layout
+_version = 2
+
+
+class _StoreVariable(object):
+    """Memory-mapped array mimicking a netcdf variable."""
+
+    def __init__(self, array, dimensions, missing, continuous=True):
+        self.array = array
+        self.dimensions = dimensions
+        self.missing = missing
+        self.continuous = continuous
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def dtype(self):
+        return self.array.dtype
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        z = self.array[index]
+        if self.missing:
+            z = np.ma.masked_invalid(z, copy=False)
+        return z
+
+
+class FrameStore(object):
+    """Memory-mapped float32 frame store opened read-only."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+        self.path = path
+        self.variables = {}
+        for varname, meta in self.index['variables'].items():
+            array = np.load(os.path.join(path, varname+'.npy'),
+                            mmap_mode='r')
+            self.variables[varname] = _StoreVariable(
+                array, tuple(meta['dimensions']), meta['missing'],
+                meta['continuous'])
+
+
+def _sources(filenames):
+    """Return source file paths with their sizes and modification times."""
+    if isinstance(filenames, str):
+        filenames = glob.glob(filenames)
+    return sorted([os.path.abspath(f), os.path.getsize(f),
+                   os.path.getmtime(f)] for f in filenames)
+
+
+def is_current(path, filenames, varnames=None):
+    """Check whether a store is up to date and has the given variables."""
+    try:
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return False
+    return (index.get('version') == _version and
+            index.get('sources') == _sources(filenames) and
+            set(varnames or []) <= set(index['variables']))
+
+
+def build(nc, path, filenames, varnames=None):
+    """Convert dataset variables to a memory-mapped frame store.
+
+    By default all variables defined on the (x, y) grid are converted.
+    Variables are converted frame by frame, so that memory use stays
+    bounded by the size of one frame.
+    """
+
+    # select variables defined on the grid
+    if varnames is None:
+        varnames = [name for name, var in nc.variables.items()
+                    if set(var.dimensions[-2:]) == set(('x', 'y')) and
+                    len(var.dimensions) in (2, 3)]
+
+    # prepare directory and remove any outdated index
+    index = os.path.join(path, 'index.json')
+    if os.path.isfile(index):
+        os.remove(index)
+    elif not os.path.isdir(path):
+        os.makedirs(path)
+    meta = dict(version=_version, sources=_sources(filenames),
+                variables={})
+
+    # convert each variable frame by frame
+    for varname in varnames:
+        var = nc.variables[varname]
+        transpose = var.dimensions[-2:] == ('x', 'y')
+        dims = var.dimensions[:-2] + ('y', 'x')
+        shape = var.shape[:-2] + ((var.shape[-1], var.shape[-2]) if transpose
+                                  else var.shape[-2:])
+        filename = os.path.join(path, varname+'.npy')
+        array = np.lib.format.open_memmap(
+            filename+'.tmp', mode='w+', dtype=np.float32, shape=shape)
+        missing = False
+        for i in (range(len(var)) if len(dims) == 3 else [Ellipsis]):
+            z = var[i]
+            missing = missing or np.ma.is_masked(z)
+            z = np.ma.filled(np.ma.asarray(z, dtype=np.float32), np.nan)
+            array[i] = z.T if transpose else z
+        array.flush()
+        del array
+        os.replace(filename+'.tmp', filename)  # keep open maps valid
+        meta['variables'][varname] = dict(dimensions=dims, missing=missing,
+                                          continuous=_is_continuous(var))
+
+    # write index last so that interrupted conversions are rebuilt
+    with open(index, 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def open_store(nc, path, filenames, varnames=None):
+    """Open a frame store, building it first if missing or outdated."""
+    if not is_current(path, filenames, varnames):
+        build(nc, path, filenames, varnames=varnames)
+    return FrameStore(path)
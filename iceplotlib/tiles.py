@@ -0,0 +1,196 @@
+""":mod:`iceplotlib.tiles`
+
+Export map tiles for web viewers.
+
+Tiles are written as fixed-size PNG images in an XYZ directory layout
+``{zoom}/{x}/{y}.png``, where row ``y`` counts from the northern edge. At the
+highest zoom level one pixel corresponds to one grid cell, and each lower
+level halves the resolution by reading every other cell. Each tile only
+reads the grid window it covers.
+
+A ``tiles.json`` manifest records a hash of the data and style used for each
+tile, so that tiles that did not change are skipped when exporting again.
+"""
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import pickle
+
+import numpy as np
+import iceplotlib.colors as icolors
+
+# dataset opened in each worker process
+_worker_nc = None
+
+
+# Tile geometry
+# -------------
+
+def max_zoom(nx, ny, tilesize=256):
+    """Return the zoom level at which one pixel corresponds to one cell."""
+    return max(0, int(math.ceil(math.log(max(nx, ny)/float(tilesize), 2))))
+
+
+def tile_window(nx, ny, zoom, i, j, tilesize=256, maxzoom=None):
+    """Return grid window as a pair of (y, x) slices for a given tile."""
+    if maxzoom is None:
+        maxzoom = max_zoom(nx, ny, tilesize)
+    step = 2**(maxzoom-zoom)
+
+    # columns are counted from the western edge
+    xstart = i*tilesize*step
+    xstop = min(nx, xstart+tilesize*step)
+
+    # rows are counted from the northern edge
+    ytop = ny - 1 - j*tilesize*step
+    ystart = ytop - step*min(tilesize-1, ytop//step)
+    return slice(ystart, ytop+1, step), slice(xstart, xstop, step)
+
+
+def iter_tiles(nx, ny, zooms=None, tilesize=256):
+    """Iterate over (zoom, x, y) indices of tiles covering the grid."""
+    maxzoom = max_zoom(nx, ny, tilesize)
+    if zooms is None:
+        zooms = range(maxzoom+1)
+    for zoom in zooms:
+        span = tilesize*2**(maxzoom-zoom)
+        for i in range(int(math.ceil(nx/float(span)))):
+            for j in range(int(math.ceil(ny/float(span)))):
+                yield zoom, i, j
+
+
+# Tile rendering
+# --------------
+
+def _render_tile(nc, task):
+    """Render and write one tile unless its hash did not change."""
+    from iceplotlib.render import colormap_lut, to_rgba, write_png
+    (zoom, i, j, window, varname, t, thkth, cmap, norm, tilesize, outdir,
+     oldhash) = task
+
+    # read data window and hash it with style parameters
+    x, y, z = nc._extract_xyz(varname, t, thkth=thkth, window=window)
+    sha = hashlib.sha1()
+    sha.update(np.ma.getdata(z).tobytes())
+    sha.update(np.ma.getmaskarray(z).tobytes())
+    sha.update(colormap_lut(cmap).tobytes())
+    sha.update(pickle.dumps((z.shape, tilesize, type(norm).__name__,
+                             norm.vmin, norm.vmax), protocol=2))
+    newhash = sha.hexdigest()
+
+    # skip existing tiles with identical hash
+    filename = os.path.join(outdir, str(zoom), str(i), '%d.png' % j)
+    if newhash == oldhash and os.path.isfile(filename):
+        return zoom, i, j, newhash, False
+
+    # render and pad tile to its full size
+    tile = np.zeros((tilesize, tilesize, 4), dtype=np.uint8)
+    rgba = to_rgba(z, cmap=cmap, norm=norm)
+    tile[tilesize-rgba.shape[0]:, :rgba.shape[1]] = rgba
+
+    # write tile with north on top
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    write_png(filename, tile)
+    return zoom, i, j, newhash, True
+
+
+def _init_worker(filename, kwargs):
+    """Open the dataset once in each worker process."""
+    global _worker_nc
+    from iceplotlib.plot import load
+    _worker_nc = load(filename, **kwargs)
+
+
+def _render_worker_tile(task):
+    return _render_tile(_worker_nc, task)
+
+
+def export_tiles(filename, varname, outdir, t=None, thkth=None, zooms=None,
+                 tilesize=256, cmap=None, norm=None, processes=None,
+                 **kwargs):
+    """Export a zoom pyramid of PNG tiles for a dataset variable.
+
+    Parameters
+    ----------
+    filename : str
+        Path or glob pattern of the files to open with
+        :func:`iceplotlib.plot.load`.
+    varname : str
+        Name of the variable to render.
+    outdir : str
+        Output directory for tiles and the ``tiles.json`` manifest.
+    t : float or str, optional
+        Time in years, or a keyword understood by the plotting methods.
+    zooms : sequence of int, optional
+        Zoom levels to export, all levels by default.
+    tilesize : int, optional
+        Tile width and height in pixels.
+    cmap, norm : optional
+        Colormap and norm, defaulting to iceplotlib's default styling. If
+        no norm is given, limits are set from the entire field.
+    processes : int, optional
+        Number of worker processes. Tiles are rendered serially in the
+        current process if 1, and by as many workers as cores if None.
+
+    Returns the numbers of tiles written and skipped.
+    """
+    from matplotlib.colors import Normalize
+    from iceplotlib.plot import load
+
+    # read grid size and manifest
+    nc = load(filename, **kwargs)
+    nx = len(nc.dimensions['x'])
+    ny = len(nc.dimensions['y'])
+    maxzoom = max_zoom(nx, ny, tilesize)
+    manifest = os.path.join(outdir, 'tiles.json')
+    hashes = {}
+    if os.path.isfile(manifest):
+        with open(manifest) as f:
+            hashes = json.load(f)
+
+    # default styling with limits from the coarsest level
+    cmap = cmap or icolors.default_cmaps.get(varname)
+    norm = norm or icolors.default_norms.get(varname)
+    if norm is None:
+        step = 2**maxzoom
+        window = slice(None, None, step), slice(None, None, step)
+        z = nc._extract_xyz(varname, t, thkth=thkth, window=window)[2]
+        norm = Normalize(z.min(), z.max())
+
+    # prepare tasks
+    tasks = []
+    for zoom, i, j in iter_tiles(nx, ny, zooms, tilesize):
+        window = tile_window(nx, ny, zoom, i, j, tilesize, maxzoom)
+        key = '%d/%d/%d' % (zoom, i, j)
+        tasks.append((zoom, i, j, window, varname, t, thkth, cmap, norm,
+                      tilesize, outdir, hashes.get(key)))
+
+    # render tiles in serial or in parallel
+    if processes == 1:
+        results = [_render_tile(nc, task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(filename, kwargs))
+        try:
+            results = pool.map(_render_worker_tile, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    nc.close()
+
+    # update manifest
+    for zoom, i, j, newhash, written in results:
+        hashes['%d/%d/%d' % (zoom, i, j)] = newhash
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    with open(manifest, 'w') as f:
+        json.dump(hashes, f, indent=0, sort_keys=True)
+
+    # return number of written and skipped tiles
+    written = sum(res[-1] for res in results)
+    return written, len(results)-written
@@ -0,0 +1,31 @@
+"""Shared fixtures for the iceplotlib test suite."""
+
+import importlib.util
+import os
+
+import pytest
+
+# draw figures without a display
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+# repository root directory
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_benchmark_module(name):
+    """Load a module from the benchmarks directory without changing the
+    import path."""
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(_root, 'benchmarks', name+'.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def zlib_dataset(tmp_path_factory):
+    """Return the path of a small compressed synthetic dataset."""
+    synthetic = load_benchmark_module('synthetic')
+    filename = str(tmp_path_factory.mktemp('data') / 'run.nc')
+    synthetic.make_dataset(filename, nx=121, ny=101, nt=12, zlib=True)
+    return filename
@@ -0,0 +1,36 @@
+"""Check that ice-cover cubes do not change extracted results."""
+
+import numpy as np
+
+
+def test_icecover_transparent(zlib_dataset, tmp_path):
+    import iceplotlib.plot as iplt
+    from iceplotlib.io import yr2s
+    plain = iplt.load(zlib_dataset)
+    cubed = iplt.load(zlib_dataset, icecover=str(tmp_path / 'icecover'))
+    times = plain.variables['time'][:]/yr2s
+
+    # map masks, also on strided windows
+    window = slice(3, 90, 2), slice(5, 110, 3)
+    for t in times:
+        assert np.array_equal(np.ma.filled(plain._extract_mask(t), True),
+                              cubed._extract_mask(t))
+        assert np.array_equal(
+            np.ma.filled(plain._extract_mask(t, window=window), True),
+            cubed._extract_mask(t, window=window))
+
+    # station time series and transects
+    rng = np.random.default_rng(0)
+    stations = np.column_stack((rng.uniform(-1.1e6, 1.1e6, 500),
+                                rng.uniform(-9e5, 9e5, 500)))
+    for varname in ('thk', 'usurf', 'velsurf'):
+        a = plain.timeseries(varname, stations)[1]
+        b = cubed.timeseries(varname, stations)[1]
+        assert np.array_equal(np.ma.getmaskarray(a), np.ma.getmaskarray(b))
+        assert np.ma.allclose(a, b)
+    line = [(-9e5, -6e5), (0.0, 2e5), (9e5, 5e5)]
+    a = plain.transect('thk', line)[2]
+    b = cubed.transect('thk', line)[2]
+    assert np.array_equal(np.ma.getmaskarray(a), np.ma.getmaskarray(b))
+    plain.close()
+    cubed.close()
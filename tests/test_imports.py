@@ -0,0 +1,22 @@
+"""Check that importing iceplotlib modules does not load heavy packages."""
+
+import pytest
+
+from conftest import load_benchmark_module
+
+# only the standard library is loaded here, not the benchmark script
+importtime = load_benchmark_module('importtime')
+
+
+@pytest.mark.parametrize('module, lazy', importtime.LAZY_IMPORTS)
+def test_lazy_imports(module, lazy):
+    modules = importtime.measure_import(module, repeat=1)['modules']
+    assert importtime.lazy_failures(module, lazy, modules) == []
+
+
+def test_plot_dir():
+    import iceplotlib.plot as iplt
+    names = dir(iplt)
+    for name in ('IceDataset', 'MFIceDataset', 'imshow', 'figure_mm',
+                 'subplots'):
+        assert name in names
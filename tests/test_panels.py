@@ -0,0 +1,22 @@
+"""Check multi-panel rendering with threaded field extraction."""
+
+import numpy as np
+
+
+def test_draw_panels_threads(zlib_dataset):
+    import iceplotlib.plot as iplt
+    from iceplotlib.io import yr2s
+    recipes = ['icemap', ('imshow', 'thk'), 'icemap', ('imshow', 'usurf'),
+               ('contour', 'topg'), ('quiver', 'velsurf')]
+    for i in range(40):
+        nc = iplt.load(zlib_dataset)
+        times = nc.variables['time'][::2]/yr2s
+        fig, axes = iplt.subplots_mm(nrows=2, ncols=3)
+        panels = {ax: (nc, t, recipe) for ax, t, recipe
+                  in zip(axes.flat, times, recipes)}
+        results = fig.draw_panels(panels, threads=6)
+        assert len(results) == 6
+        thk = axes.flat[1].get_images()[0].get_array()
+        assert np.ma.allclose(thk, nc._extract_xyz('thk', times[1])[2])
+        iplt.close(fig)
+        nc.close()
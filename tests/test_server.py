@@ -0,0 +1,67 @@
+"""Check the render server with concurrent clients."""
+
+import os
+import threading
+from urllib.error import HTTPError
+
+import pytest
+
+
+@pytest.fixture
+def server(zlib_dataset):
+    from iceplotlib.server import RenderServer
+    server = RenderServer(('localhost', 0), root=os.path.dirname(
+        zlib_dataset), workers=4)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server, 'http://localhost:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_concurrent_fetch(server, zlib_dataset):
+    import iceplotlib.plot as iplt
+    from iceplotlib.server import fetch, render_png
+    server, url = server
+    filename = os.path.basename(zlib_dataset)
+    requests = [dict(var=var, t=t) for var in ('icemap', 'thk', 'usurf')
+                for t in (-20e3, -15e3, -10e3, -5e3)]
+    results = {}
+    errors = []
+
+    def client(k):
+        try:
+            for i in range(k, k+40):
+                params = requests[i % len(requests)]
+                results[i % len(requests)] = fetch(
+                    url, file=filename, **params)
+                fetch(url, file=filename, var=params['var'],
+                      t=params['t']+i, bbox='%d,-4e5,4e5,4e5' % (-i*1e4),
+                      size='64,64')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    nc = iplt.load(zlib_dataset)
+    for i, params in enumerate(requests):
+        assert results[i] == render_png(nc, params['var'], t=params['t'])
+    nc.close()
+
+
+@pytest.mark.parametrize('params', [
+    dict(bbox='1,2,3'), dict(bbox='0,0,-1,1'), dict(size='10'),
+    dict(size='10,0'), dict(var='nope'), dict(t='soon')])
+def test_bad_request(server, zlib_dataset, params):
+    from iceplotlib.server import fetch
+    server, url = server
+    params = dict(dict(file=os.path.basename(zlib_dataset), var='thk'),
+                  **params)
+    with pytest.raises(HTTPError) as excinfo:
+        fetch(url, **params)
+    assert excinfo.value.code == 400